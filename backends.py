@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from cache import cache_available, cache_path, is_fresh
+from cube import CUBE_COLUMNS, CUBE_DIMENSIONS, MEAN_MEASURES, SUM_MEASURES
+from ingest import iter_clean_chunks, load_cube as load_cube_pandas
+from profiling import profiler
+
+try:
+    import duckdb
+except ImportError:  # optional out-of-core backend
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:  # optional out-of-core backend
+    pl = None
+
+# Execution backends for building the cube. 'pandas' aggregates in memory (or
+# chunk by chunk with a chunk size). 'duckdb' and 'polars' aggregate the
+# parquet cache of the cleaned data out of core, spilling to disk and using
+# every core; their cube is normalized to the same dtypes, categories and row
+# order as the pandas cube, so every table built from it is the same
+
+BACKENDS = ['pandas', 'duckdb', 'polars']
+
+# Rows per chunk when the parquet cache has to be built first for an out-of-core backend
+CACHE_CHUNK_SIZE = 1_000_000
+
+
+def available_backends():
+    return ['pandas'] + [name for name, module in [('duckdb', duckdb), ('polars', pl)] if module is not None]
+
+
+def check_backend(backend, use_cache=True):
+    # Raise ValueError if `backend` cannot build the cube here
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend}; expected one of {', '.join(BACKENDS)}")
+    if backend == 'pandas':
+        return
+    if backend not in available_backends():
+        raise ValueError(f'the {backend} backend needs the {backend} package (pip install {backend})')
+    if not cache_available():
+        raise ValueError(f'the {backend} backend reads the parquet cache, which needs pyarrow')
+    if not use_cache:
+        raise ValueError(f'the {backend} backend reads the parquet cache and cannot run with it disabled')
+
+
+def _clean_parquet(path, chunksize=None):
+    # Parquet file of the cleaned export for the out-of-core backends, written by
+    # streaming the CSV through the cleaning pipeline when it is missing or stale
+    cache_file = cache_path(path)
+    if not is_fresh(path, cache_file):
+        for _ in iter_clean_chunks(path, chunksize or CACHE_CHUNK_SIZE):
+            pass
+    return cache_file
+
+
+def _layout(columns):
+    # (dimensions, summed measures, averaged columns) among `columns`
+    return ([dim for dim in CUBE_DIMENSIONS if dim in columns],
+            [measure for measure in SUM_MEASURES if measure in columns],
+            {column: pair for column, pair in MEAN_MEASURES.items() if column in columns})
+
+
+def _as_cube(result, cache_file, columns):
+    # Give an engine's aggregate the pandas cube's layout: categorical dimensions
+    # with sorted categories, the same measure dtypes, and cells in order of their
+    # first row (the order groupby(sort=False) produces)
+    dims, sums, means = _layout(columns)
+    schema = pd.read_parquet(cache_file, columns=sums).head(0).dtypes
+    cube = result.sort_values('first_row', kind='stable').reset_index(drop=True)
+    for dim in dims:
+        cube[dim] = pd.Categorical(cube[dim], categories=sorted(cube[dim].dropna().unique()))
+    for measure in sums:
+        if pd.api.types.is_integer_dtype(schema[measure]):
+            # pandas keeps integer sums in the column's dtype unless one would
+            # overflow it, and widens them to int64 then
+            limits = np.iinfo(schema[measure])
+            fits = cube[measure].between(limits.min, limits.max).all()
+            cube[measure] = cube[measure].astype(schema[measure] if fits else np.int64)
+        else:
+            # build_cube accumulates float32 measures in float64
+            cube[measure] = cube[measure].astype(np.float64)
+    for sum_name, count_name in means.values():
+        cube[sum_name] = cube[sum_name].astype(np.float64)
+        cube[count_name] = cube[count_name].astype(np.int64)
+    cube['rows'] = cube['rows'].astype(np.int64)
+    cube['first_row'] = cube['first_row'].astype(np.int64)
+    return cube
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _duckdb_cube(cache_file, columns):
+    # NaN is not a missing value to SQL; count only the values pandas would
+    def count(column):
+        return f'COUNT(CASE WHEN NOT isnan({_quote(column)}::DOUBLE) THEN 1 END)'
+
+    def total(column):
+        return f'kahan_sum(CASE WHEN NOT isnan({_quote(column)}::DOUBLE) THEN {_quote(column)}::DOUBLE END)'
+
+    dims, sums, means = _layout(columns)
+    select = [_quote(dim) for dim in dims]
+    select += [f'{total(measure)} AS {_quote(measure)}' for measure in sums]
+    for column, (sum_name, count_name) in means.items():
+        select += [f'{total(column)} AS {_quote(sum_name)}', f'{count(column)} AS {_quote(count_name)}']
+    select += ['COUNT(*) AS "rows"', 'MIN(file_row_number) AS first_row']
+    sql = f"SELECT {', '.join(select)} FROM read_parquet(?, file_row_number = true)"
+    if dims:
+        sql += f" GROUP BY {', '.join(_quote(dim) for dim in dims)}"
+    with duckdb.connect() as connection:
+        result = connection.execute(sql, [cache_file]).df()
+    # Sums over groups with no values come back as NULL; pandas sums them to 0
+    return result.fillna({name: 0 for name in sums + [sum_name for sum_name, _ in means.values()]})
+
+
+def _polars_cube(cache_file, columns):
+    dims, sums, means = _layout(columns)
+    frame = pl.scan_parquet(cache_file).with_row_index('_row')
+    aggregations = [pl.col(measure).cast(pl.Float64).fill_nan(None).sum() for measure in sums]
+    for column, (sum_name, count_name) in means.items():
+        values = pl.col(column).cast(pl.Float64).fill_nan(None)
+        aggregations += [values.sum().alias(sum_name), values.count().alias(count_name)]
+    aggregations += [pl.len().alias('rows'), pl.col('_row').min().alias('first_row')]
+    frame = frame.group_by(dims).agg(aggregations) if dims else frame.select(aggregations)
+    return frame.collect(engine='streaming').to_pandas()
+
+
+def load_cube(path, backend='pandas', chunksize=None, use_cache=True, columns=None):
+    # Build the cube for `path` with the given backend, from `columns` (a subset
+    # of CUBE_COLUMNS, all of them by default)
+    check_backend(backend, use_cache)
+    if backend == 'pandas':
+        return load_cube_pandas(path, chunksize=chunksize, use_cache=use_cache, columns=columns)
+    build = {'duckdb': _duckdb_cube, 'polars': _polars_cube}[backend]
+    columns = [column for column in CUBE_COLUMNS if column in (columns or CUBE_COLUMNS)]
+    cache_file = _clean_parquet(path, chunksize)
+    with profiler.stage(f'cube.{backend}') as span:
+        cube = _as_cube(build(cache_file, columns), cache_file, columns)
+        span['rows'] = int(cube['rows'].sum())
+    return cube
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from ingest import DATE_COLUMN, DIMENSION_DTYPES, RAW_COLUMNS
+
+# Benchmark harness: generates synthetic exports with the same schema as
+# 'Excelerate data.csv', times each pipeline stage in a fresh process and
+# writes the results as JSON so runs can be compared
+
+AGE_GROUPS = ['13-17', '18-24', '25-34', '35-44', '45-54', '55-64']
+AUDIENCES = ['Students', 'Educators and Principals']
+COUNTRIES = ['Australia', 'Canada', 'Ghana', 'India', 'Nepal', 'Nigeria', 'Pakistan', 'Thailand', 'Taiwan']
+
+
+def parse_count(text):
+    # '10k' -> 10_000, '50M' -> 50_000_000
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1].lower(), 1)
+    return int(float(text.rstrip('kKmM')) * multiplier)
+
+
+def _currency(values):
+    # Vectorized '$1,234.56' formatting (values below ten million)
+    cents = np.round(values * 100).astype(np.int64)
+    whole, cents = pd.Series(cents // 100), pd.Series(cents % 100).astype(str).str.zfill(2)
+    thousands, units = whole // 1000, whole % 1000
+    grouped = (thousands.astype(str) + ',' + units.astype(str).str.zfill(3)).where(thousands > 0, units.astype(str))
+    return '$' + grouped + '.' + cents
+
+
+def _geography(i):
+    # Two multi-country groups, then single countries (numbered once they run out)
+    if i < 2:
+        return f'Group {i + 1} ({", ".join(COUNTRIES)})'
+    country = COUNTRIES[(i - 2) % len(COUNTRIES)]
+    return country if i - 2 < len(COUNTRIES) else f'{country} {(i - 2) // len(COUNTRIES)}'
+
+
+def generate(path, rows, campaigns=7, geographies=7, ages=6, audiences=2, missing_campaign_ids=0.05,
+             seed=0, chunksize=1_000_000, days=0):
+    # Write a synthetic export of `rows` rows with the given cardinalities, a chunk at a time.
+    # With `days`, rows also get a reporting date within that many days from 2024-01-01
+    rng = np.random.default_rng(seed)
+    campaign_ids = np.array([f'{120200000000000 + i}' for i in range(campaigns)], dtype=object)
+    campaign_names = np.array([f'SHU_Students_{i}' for i in range(campaigns)], dtype=object)
+    geography_names = np.array([_geography(i) for i in range(geographies)], dtype=object)
+    age_groups = np.array(AGE_GROUPS[:ages] + [f'{65 + 5 * i}-{69 + 5 * i}' for i in range(ages - len(AGE_GROUPS))], dtype=object)
+    audience_names = np.array(AUDIENCES[:audiences] + [f'Audience {i}' for i in range(audiences - len(AUDIENCES))], dtype=object)
+
+    header = True
+    for start in range(0, rows, chunksize):
+        n = min(chunksize, rows - start)
+        campaign = rng.integers(0, campaigns, n)
+        ids = campaign_ids[campaign]
+        ids[rng.random(n) < missing_campaign_ids] = None
+        impressions = rng.integers(0, 5000, n)
+        clicks = (impressions * rng.random(n) * 0.05).astype(np.int64)
+        spend = rng.random(n) * 3000
+        cpc = _currency(spend / np.maximum(clicks, 1)).where(clicks > 0)
+        chunk = pd.DataFrame({
+            'campaign ID': ids,
+            'Campaign Name': campaign_names[campaign],
+            'Age': age_groups[rng.integers(0, ages, n)],
+            'Audience': audience_names[rng.integers(0, audiences, n)],
+            'Geography': geography_names[rng.integers(0, geographies, n)],
+            'Reach': (impressions * 0.7).astype(np.int64),
+            'Impressions': impressions,
+            'Clicks': clicks,
+            'Amount Spent in INR': _currency(spend),
+            'Cost Per Click (CPC)': cpc,
+            'Click-Through Rate (CTR in %)': np.where(impressions > 0, clicks / np.maximum(impressions, 1) * 100, np.nan),
+        })
+        if days:
+            chunk[DATE_COLUMN] = (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, days, n), unit='D')).strftime('%Y-%m-%d')
+        chunk.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(path, render=True, dpi=300):
+    # Time each stage of the pipeline on `path`; meant to run in a fresh process
+    # so the peak RSS figures belong to this case alone
+    from charts import render_charts
+    from cleaning import clean
+    from cube import build_cube
+    from insights import build_tables, chart_jobs
+
+    stages = {}
+
+    def timed(name, func, *args, **kwargs):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = func(*args, **kwargs)
+        stages[name] = {
+            'wall_s': round(time.perf_counter() - wall, 4),
+            'cpu_s': round(time.process_time() - cpu, 4),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+        }
+        return result
+
+    raw = timed('load', pd.read_csv, path, usecols=RAW_COLUMNS, dtype=DIMENSION_DTYPES)
+    df = timed('clean', clean, raw)
+    tables = timed('aggregate', lambda: build_tables(build_cube(df)))
+    if render:
+        with tempfile.TemporaryDirectory() as output_dir:
+            timed('render', render_charts, chart_jobs(tables), output_dir=output_dir, dpi=dpi, force=True)
+    return stages
+
+
+def compare(results, baseline):
+    # Print the wall-time ratio of every (rows, stage) also present in the baseline
+    previous = {(case['rows'], case['cardinalities']['campaigns']): case['stages'] for case in baseline['results']}
+    for case in results['results']:
+        before = previous.get((case['rows'], case['cardinalities']['campaigns']))
+        if before is None:
+            continue
+        for stage, timing in case['stages'].items():
+            if stage in before and before[stage]['wall_s'] > 0:
+                ratio = timing['wall_s'] / before[stage]['wall_s']
+                print(f"{case['rows']:>12,} rows  {stage:<10} {ratio:6.2f}x  "
+                      f"({before[stage]['wall_s']:.3f}s -> {timing['wall_s']:.3f}s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the campaign analysis pipeline on synthetic exports.')
+    parser.add_argument('--rows', nargs='+', default=['10k', '100k', '1M'],
+                        help='row counts to benchmark, e.g. 10k 1M 50M')
+    parser.add_argument('--campaigns', type=int, default=7)
+    parser.add_argument('--geographies', type=int, default=7)
+    parser.add_argument('--ages', type=int, default=6)
+    parser.add_argument('--audiences', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default='bench_data', help='where generated exports are kept and reused')
+    parser.add_argument('--no-render', dest='render', action='store_false', help='skip the render stage')
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    cardinalities = {'campaigns': args.campaigns, 'geographies': args.geographies,
+                     'ages': args.ages, 'audiences': args.audiences}
+    results = {
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+        },
+        'results': [],
+    }
+    os.makedirs(args.data_dir, exist_ok=True)
+    for rows in map(parse_count, args.rows):
+        path = os.path.join(args.data_dir, 'synthetic-{}-{campaigns}c-{geographies}g-{ages}a-{audiences}u-s{}.csv'
+                            .format(rows, args.seed, **cardinalities))
+        if not os.path.exists(path):
+            generate(path, rows, seed=args.seed, **cardinalities)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            stages = pool.submit(run_case, path, render=args.render, dpi=args.dpi).result()
+        results['results'].append({'rows': rows, 'file_mb': round(os.path.getsize(path) / 1024 ** 2, 1),
+                                   'cardinalities': cardinalities, 'stages': stages})
+        print(f"{rows:>12,} rows  " + '  '.join(
+            f"{stage} {timing['wall_s']:.3f}s/{timing['peak_rss_mb']:.0f}MB" for stage, timing in stages.items()))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
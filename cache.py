@@ -0,0 +1,101 @@
+import os
+
+from cleaning import CATEGORICAL_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the cache is optional; without pyarrow every run re-parses the CSV
+    pa = None
+    pq = None
+
+# Bump when the cleaning pipeline changes so old caches are rebuilt
+CACHE_VERSION = 2
+
+# Default cache directory, created next to the source file
+CACHE_DIR = '.cache'
+
+# Dimension columns stored as dictionary-encoded (categorical) strings
+DICTIONARY_COLUMNS = CATEGORICAL_COLUMNS + ['Geography_Clean']
+
+FINGERPRINT_KEY = b'source_fingerprint'
+
+
+def cache_available():
+    return pq is not None
+
+
+def source_fingerprint(path):
+    # Size and modification time of the source, plus the cleaning version
+    stat = os.stat(path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}-v{CACHE_VERSION}'
+
+
+def cache_path(path, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path) or '.', CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, stem + '.parquet')
+
+
+def is_fresh(path, cache_file):
+    # The cache is valid only if it was written from the current version of `path`
+    if not cache_available() or not os.path.exists(cache_file):
+        return False
+    try:
+        metadata = pq.read_schema(cache_file).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return metadata.get(FINGERPRINT_KEY) == source_fingerprint(path).encode()
+
+
+def read_cached(cache_file, columns=None):
+    # Projected, memory-mapped read of the cleaned frame
+    return pq.read_table(cache_file, columns=columns, memory_map=True).to_pandas()
+
+
+def iter_cached(cache_file, chunksize, columns=None):
+    # Projected, memory-mapped read of the cleaned frame in batches of `chunksize` rows
+    parquet_file = pq.ParquetFile(cache_file, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+class CacheWriter:
+    # Writes cleaned frames (the whole file or successive chunks) to a parquet cache.
+    # The file is written under a temporary name and only moved into place by
+    # close(), so an interrupted run never leaves a half-written cache behind
+
+    def __init__(self, path, cache_file):
+        self.cache_file = cache_file
+        self.fingerprint = source_fingerprint(path)
+        self.tmp_file = cache_file + '.tmp'
+        self.schema = None
+        self.writer = None
+
+    def _schema_for(self, df):
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        for name in DICTIONARY_COLUMNS:
+            if name in schema.names:
+                index = schema.get_field_index(name)
+                schema = schema.set(index, pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        metadata = dict(schema.metadata or {})
+        metadata[FINGERPRINT_KEY] = self.fingerprint.encode()
+        return schema.with_metadata(metadata)
+
+    def write(self, df):
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            self.schema = self._schema_for(df)
+            self.writer = pq.ParquetWriter(self.tmp_file, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.tmp_file, self.cache_file)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.remove(self.tmp_file)
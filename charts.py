@@ -0,0 +1,452 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import matplotlib
+from matplotlib import cm
+from matplotlib.figure import Figure
+import seaborn as sns
+import numpy as np
+import pandas as pd
+
+from profiling import profiler
+
+# Each chart is a function that draws one precomputed table and saves it.
+# Figures are plain matplotlib Figure objects, never registered with pyplot,
+# so nothing is ever shown and nothing is left open once a chart is saved
+
+# One figure per figure size in each process, cleared and reused between charts
+_figures = {}
+
+# Bump when the drawing code or styling changes so every chart is redrawn
+CHART_VERSION = 3
+
+# Charts with one bar per campaign show at most this many bars: the largest
+# ones, plus an 'Other' bar for ratios (CPM, CPC, clicks per spend) that can
+# be recombined from the folded campaigns' totals. Summed measures get no
+# 'Other' bar, which would dwarf every campaign's own bar. Per-bar and
+# per-point labels are only drawn up to this many, which keeps artist creation
+# and layout time bounded however many campaign IDs the export has
+MAX_BARS = 25
+
+# Heatmaps label at most this many rows; beyond that every n-th row is labelled
+MAX_TICK_LABELS = 30
+
+# Fingerprints of the charts in an output directory, used to skip unchanged charts
+MANIFEST_FILE = '.charts.json'
+
+
+def apply_style():
+    # Set style for better visuals
+    matplotlib.style.use('default')
+    sns.set_palette("husl")
+
+
+def _figure(figsize):
+    fig = _figures.get(figsize)
+    if fig is None:
+        fig = _figures[figsize] = Figure(figsize=figsize)
+    fig.clear()
+    return fig, fig.add_subplot()
+
+
+def _top(table, by, other=None):
+    # `table` cut to the MAX_BARS rows with the largest `by`, in their original
+    # order, with the remaining rows folded into one row built by other(rest)
+    # when given. Returns the table and a title suffix for when rows were cut
+    if len(table) <= MAX_BARS:
+        return table, ''
+    keep = table.index.isin(table.nlargest(MAX_BARS - (other is not None), by).index)
+    top = table[keep]
+    if other is not None:
+        top = pd.concat([top, pd.DataFrame([other(table[~keep])])], ignore_index=True)
+    return top, f' (top {keep.sum()} of {len(table)})'
+
+
+def _other(label_column, **columns):
+    # other() for _top: the label 'Other (n)' and each column computed from the folded rows
+    def other(rest):
+        row = {label_column: f'Other ({len(rest)})'}
+        row.update({column: compute(rest) for column, compute in columns.items()})
+        return row
+    return other
+
+
+def _tick_alignment(shown):
+    # A cut chart's rotated labels end under their bar, so the 'Other (n)' label
+    # and long campaign IDs do not run into their neighbours
+    return {'ha': 'right', 'rotation_mode': 'anchor'} if shown else {}
+
+
+def _save(fig, path, dpi):
+    with profiler.stage('chart.layout'):
+        fig.tight_layout()
+    with profiler.stage('chart.savefig'):
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    # Drop the artists now rather than when the figure is next reused
+    fig.clear()
+
+
+# 1.1 Top Campaigns by CTR
+def top_campaigns_ctr(campaign_performance, path, dpi=300):
+    fig, ax = _figure((12, 8))
+    top_campaigns = campaign_performance.nlargest(10, 'Click-Through Rate (CTR in %)')
+    bars = ax.bar(range(len(top_campaigns)), top_campaigns['Click-Through Rate (CTR in %)'],
+                  color=['#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6'][:len(top_campaigns)])
+    ax.set_title('Top Campaigns by Click-Through Rate', fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Campaign')
+    ax.set_ylabel('CTR (%)')
+    ax.set_xticks(range(len(top_campaigns)), [name[:20]+'...' if len(name) > 20 else name
+                                              for name in top_campaigns.index], rotation=45, ha='right')
+    ax.grid(axis='y', alpha=0.3)
+
+    # Add value labels on bars
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
+                f'{height:.1f}%', ha='center', va='bottom', fontweight='bold', fontsize=10)
+
+    _save(fig, path, dpi)
+
+
+# 1.2 Age Group Performance
+def age_group_ctr(age_performance, path, dpi=300):
+    fig, ax = _figure((10, 6))
+    bars = ax.bar(age_performance['Age'], age_performance['CTR'],
+                  color=['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#ffeaa7'])
+    ax.set_title('Click-Through Rate by Age Group', fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Age Group')
+    ax.set_ylabel('CTR (%)')
+    ax.grid(axis='y', alpha=0.3)
+
+    # Add value labels
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
+                f'{height:.1f}%', ha='center', va='bottom', fontweight='bold', fontsize=10)
+
+    _save(fig, path, dpi)
+
+
+# 1.3 Campaign ID Cost Efficiency Analysis
+def cost_vs_performance_campaign_id(campaign_cost, path, dpi=300):
+    fig, ax = _figure((10, 6))
+    ax.scatter(campaign_cost['CPC_Clean'], campaign_cost['Clicks'],
+               s=campaign_cost['Amount Spent in INR']/1000, alpha=0.7,
+               c=range(len(campaign_cost)), cmap='viridis')
+    ax.set_title('Cost vs Performance by Campaign ID', fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Cost Per Click (INR)')
+    ax.set_ylabel('Total Clicks')
+    ax.grid(True, alpha=0.3)
+
+    # Add labels for each point (the biggest spenders when there are many)
+    labelled = campaign_cost if len(campaign_cost) <= MAX_BARS else campaign_cost.nlargest(MAX_BARS, 'Amount Spent in INR')
+    for _, row in labelled.iterrows():
+        ax.annotate(row['campaign ID'][:12],
+                    (row['CPC_Clean'], row['Clicks']),
+                    xytext=(5, 5), textcoords='offset points',
+                    fontsize=9, alpha=0.8)
+
+    _save(fig, path, dpi)
+
+
+# 1.4 Audience Type Comparison
+def audience_roi_comparison(audience_stats, path, dpi=300):
+    fig, ax = _figure((8, 6))
+    bars = ax.bar(audience_stats['Audience'], audience_stats['ROI'],
+                  color=['#e74c3c', '#3498db'])
+    ax.set_title('Return on Investment by Audience Type\n(Clicks per $1000 spent)', fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Audience Type')
+    ax.set_ylabel('Clicks per $1000')
+    ax.grid(axis='y', alpha=0.3)
+
+    # Add value labels
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height + 1,
+                f'{height:.1f}', ha='center', va='bottom', fontweight='bold', fontsize=10)
+
+    _save(fig, path, dpi)
+
+
+# 2.1 Total Reach by Campaign ID
+def campaign_id_reach_basic(campaign_analysis, path, dpi=300):
+    fig, ax = _figure((12, 8))
+    campaign_analysis, shown = _top(campaign_analysis, 'Reach')
+    ax.barh(campaign_analysis['campaign ID'], campaign_analysis['Reach'],
+            color=cm.Set3(np.linspace(0, 1, len(campaign_analysis))))
+    ax.set_title('Total Reach by Campaign ID' + shown, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Reach')
+    ax.grid(axis='x', alpha=0.3)
+    _save(fig, path, dpi)
+
+
+# 2.2 Average CTR by Campaign ID
+def campaign_id_ctr_basic(campaign_analysis, path, dpi=300):
+    fig, ax = _figure((12, 8))
+    # The per-row CTR average cannot be recombined for an 'Other' bar; show the campaigns with most impressions
+    campaign_analysis, shown = _top(campaign_analysis, 'Impressions')
+    ax.barh(campaign_analysis['campaign ID'], campaign_analysis['Click-Through Rate (CTR in %)'],
+            color=cm.Set2(np.linspace(0, 1, len(campaign_analysis))))
+    ax.set_title('Average CTR by Campaign ID' + shown, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('CTR (%)')
+    ax.grid(axis='x', alpha=0.3)
+    _save(fig, path, dpi)
+
+
+# 2.3 Spend vs Clicks Scatter for Campaign ID
+def campaign_id_spend_vs_clicks_basic(campaign_analysis, path, dpi=300):
+    fig, ax = _figure((10, 8))
+    points = ax.scatter(campaign_analysis['Amount Spent in INR'], campaign_analysis['Clicks'],
+                        s=campaign_analysis['Reach']/100, alpha=0.7,
+                        c=campaign_analysis['Click-Through Rate (CTR in %)'], cmap='RdYlBu_r')
+    fig.colorbar(points, ax=ax, label='CTR (%)')
+    ax.set_title('Spend vs Clicks by Campaign ID\n(Bubble size = Reach)', fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Amount Spent (INR)')
+    ax.set_ylabel('Total Clicks')
+    ax.grid(True, alpha=0.3)
+    _save(fig, path, dpi)
+
+
+# 2.4 Cost Per 1000 Impressions (CPM) by Campaign ID
+def campaign_id_cpm(campaign_analysis, path, dpi=300):
+    fig, ax = _figure((12, 6))
+    campaign_analysis, shown = _top(campaign_analysis, 'Amount Spent in INR', _other(
+        'campaign ID', CPM=lambda rest: rest['Amount Spent in INR'].sum() / rest['Impressions'].sum() * 1000))
+    ax.bar(range(len(campaign_analysis)), campaign_analysis['CPM'],
+           color=cm.viridis(np.linspace(0, 1, len(campaign_analysis))))
+    ax.set_title('Cost Per 1000 Impressions (CPM) by Campaign ID' + shown, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Campaign ID')
+    ax.set_ylabel('CPM (INR)')
+    ax.set_xticks(range(len(campaign_analysis)),
+                  [cid[:15]+'...' if len(cid) > 15 else cid for cid in campaign_analysis['campaign ID']],
+                  rotation=45, ha='right')
+    ax.grid(axis='y', alpha=0.3)
+    _save(fig, path, dpi)
+
+
+# 3.x Age Group by Audience Type (grouped bars of an Age x Audience pivot)
+def age_group_by_audience(pivot, path, colors, title, ylabel, dpi=300):
+    fig, ax = _figure((12, 8))
+    pivot.plot(kind='bar', color=colors, ax=ax)
+    ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Age Group')
+    ax.set_ylabel(ylabel)
+    ax.legend(title='Audience Type', bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.grid(axis='y', alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    _save(fig, path, dpi)
+
+
+# 4.1 Cost Per Click by Campaign ID
+def campaign_id_cpc_advanced(campaign_id_stats, path, dpi=300):
+    fig, ax = _figure((12, 8))
+    campaign_id_stats, shown = _top(campaign_id_stats, 'Amount Spent in INR', _other(
+        'campaign ID', CPC=lambda rest: rest['Amount Spent in INR'].sum() / rest['Clicks'].sum()))
+    bars = ax.bar(range(len(campaign_id_stats)), campaign_id_stats['CPC'],
+                  color=cm.plasma(np.linspace(0, 1, len(campaign_id_stats))))
+    ax.set_title('Cost Per Click by Campaign ID' + shown, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Campaign ID')
+    ax.set_ylabel('CPC (INR)')
+    ax.set_xticks(range(len(campaign_id_stats)), [cid[:15] for cid in campaign_id_stats['campaign ID']], rotation=45,
+                  **_tick_alignment(shown))
+    ax.grid(axis='y', alpha=0.3)
+    # Add value labels
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height + height*0.01,
+                f'₹{height:.1f}', ha='center', va='bottom', fontsize=9)
+    _save(fig, path, dpi)
+
+
+# 4.2 Campaign Efficiency (Clicks per ₹1000 spent)
+def campaign_id_efficiency_advanced(campaign_id_stats, path, dpi=300):
+    fig, ax = _figure((12, 8))
+    campaign_id_stats, shown = _top(campaign_id_stats, 'Amount Spent in INR', _other(
+        'campaign ID', **{column: lambda rest, column=column: rest[column].sum()
+                          for column in ['Clicks', 'Amount Spent in INR']}))
+    efficiency = campaign_id_stats['Clicks'] / campaign_id_stats['Amount Spent in INR'] * 1000
+    bars = ax.bar(range(len(campaign_id_stats)), efficiency,
+                  color=cm.coolwarm(np.linspace(0, 1, len(campaign_id_stats))))
+    ax.set_title('Campaign Efficiency\n(Clicks per ₹1000 spent)' + shown, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Campaign ID')
+    ax.set_ylabel('Clicks per ₹1000')
+    ax.set_xticks(range(len(campaign_id_stats)), [cid[:15] for cid in campaign_id_stats['campaign ID']], rotation=45,
+                  **_tick_alignment(shown))
+    ax.grid(axis='y', alpha=0.3)
+    # Add value labels
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height + 1,
+                f'{height:.1f}', ha='center', va='bottom', fontsize=10)
+    _save(fig, path, dpi)
+
+
+# 5.x Heatmap: Campaign ID vs Age Group
+def campaign_id_age_heatmap(pivot, path, cmap, label, title, dpi=300):
+    fig, ax = _figure((12, 8))
+    im = ax.imshow(pivot.values, cmap=cmap, aspect='auto')
+    fig.colorbar(im, ax=ax, label=label)
+    ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Age Group')
+    ax.set_ylabel('Campaign ID')
+    ax.set_xticks(range(len(pivot.columns)), pivot.columns, rotation=45)
+    # The image is one artist whatever its size; keep the row labels legible and few
+    step = -(-len(pivot.index) // MAX_TICK_LABELS)
+    ax.set_yticks(range(0, len(pivot.index), step), [cid[:15] for cid in pivot.index[::step]])
+    _save(fig, path, dpi)
+
+
+# 6.1 Campaign ID Performance Comparison (Reach vs ROI)
+def campaign_id_performance_comparison(campaign_comparison, path, dpi=300):
+    fig, ax = _figure((14, 8))
+    campaign_comparison, shown = _top(campaign_comparison, 'Reach')
+    x = np.arange(len(campaign_comparison))
+    width = 0.35
+
+    bars1 = ax.bar(x - width/2, campaign_comparison['Reach_per_1000'], width,
+                   label='Reach (in thousands)', color='skyblue', alpha=0.8)
+    bars2 = ax.bar(x + width/2, campaign_comparison['ROI'], width,
+                   label='ROI (Clicks per ₹1000)', color='lightcoral', alpha=0.8)
+
+    ax.set_title('Campaign ID Performance Comparison\n(Reach vs ROI)' + shown, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Campaign ID')
+    ax.set_ylabel('Performance Metrics')
+    ax.set_xticks(x, [cid[:20] for cid in campaign_comparison['campaign ID']], rotation=45, **_tick_alignment(shown))
+    ax.legend()
+    ax.grid(axis='y', alpha=0.3)
+
+    # Add value labels
+    for bar in bars1:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height + 1,
+                f'{height:.0f}K', ha='center', va='bottom', fontsize=9)
+
+    for bar in bars2:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height + 1,
+                f'{height:.1f}', ha='center', va='bottom', fontsize=9)
+
+    _save(fig, path, dpi)
+
+
+# 6.2 Total Clicks by Campaign
+def campaign_total_clicks(campaign_comparison, path, dpi=300):
+    fig, ax = _figure((14, 8))
+    campaign_comparison, shown = _top(campaign_comparison, 'Clicks')
+    campaign_names = [name[:30] + '...' if len(name) > 30 else name
+                      for name in campaign_comparison['Campaign Name']]
+    bars = ax.barh(campaign_names, campaign_comparison['Clicks'],
+                   color=cm.Set3(np.linspace(0, 1, len(campaign_comparison))))
+    ax.set_title('Total Clicks by Campaign' + shown, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Total Clicks')
+    ax.grid(axis='x', alpha=0.3)
+
+    # Add value labels
+    for bar in bars:
+        width = bar.get_width()
+        ax.text(width + width*0.01, bar.get_y() + bar.get_height()/2,
+                f'{int(width):,}', ha='left', va='center', fontsize=9)
+
+    _save(fig, path, dpi)
+
+
+def _init_renderer():
+    # Render off-screen with the report style
+    matplotlib.use('Agg')
+    apply_style()
+
+
+def _init_worker(profile=False):
+    _init_renderer()
+    # Forked workers inherit the parent's open stages; start from a clean slate
+    profiler.reset()
+    profiler.enable(profile)
+
+
+def render_job(job, output_dir='.', fmt='png', dpi=300):
+    # job = (chart function, output name without extension, table, extra keyword arguments).
+    # Returns the output path and the profiler spans recorded while rendering
+    chart, name, table, options = job
+    path = os.path.join(output_dir, f'{name}.{fmt}')
+    first_span = len(profiler.spans)
+    with profiler.stage(f'chart {name}', rows=len(table)):
+        chart(table, path, dpi=dpi, **options)
+    return path, profiler.spans[first_span:]
+
+
+def render_bytes(job, fmt='png', dpi=300):
+    # Render a job in memory and return the encoded image
+    chart, name, table, options = job
+    buffer = io.BytesIO()
+    with matplotlib.rc_context({'savefig.format': fmt}):
+        chart(table, buffer, dpi=dpi, **options)
+    return buffer.getvalue()
+
+
+def render_pool(workers=None, mp_context=None):
+    # Process pool whose workers are set up to render charts
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                               initargs=(profiler.enabled,))
+
+
+def chart_fingerprint(job, fmt, dpi):
+    # Hash of everything a chart's output depends on: the table it draws (values,
+    # index and column labels), its options, the output format and the chart code version
+    chart, name, table, options = job
+    digest = hashlib.sha256()
+    digest.update(repr((CHART_VERSION, chart.__name__, name, sorted(options.items()), fmt, dpi)).encode())
+    digest.update(repr((list(table.index.names), list(table.columns))).encode())
+    digest.update(pd.util.hash_pandas_object(table, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def _read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def render_charts(jobs, output_dir='.', fmt='png', dpi=300, workers=None, force=False):
+    # Render the jobs whose fingerprint changed since the last run into output_dir
+    # (all of them with force=True), across a process pool when workers > 1. Each
+    # job gets its own figure, so jobs are independent and finish in any order.
+    # Returns the paths that were rendered
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _read_manifest(output_dir)
+    fingerprints = {job[1]: chart_fingerprint(job, fmt, dpi) for job in jobs}
+    stale = [job for job in jobs
+             if force or manifest.get(job[1]) != fingerprints[job[1]]
+             or not os.path.exists(os.path.join(output_dir, f'{job[1]}.{fmt}'))]
+    if not stale:
+        return []
+
+    render = partial(render_job, output_dir=output_dir, fmt=fmt, dpi=dpi)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(stale))
+    if workers <= 1:
+        _init_renderer()
+        paths = [render(job)[0] for job in stale]
+    else:
+        with render_pool(workers) as pool:
+            results = list(pool.map(render, stale))
+        paths = [path for path, _ in results]
+        for _, spans in results:
+            profiler.extend(spans)
+
+    manifest.update({job[1]: fingerprints[job[1]] for job in stale})
+    _write_manifest(output_dir, manifest)
+    return paths
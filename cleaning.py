@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from profiling import profiler
+
+# Cleaning steps shared by the full-file and streaming loaders. Everything here
+# works column-at-a-time; per-value Python only ever runs over distinct values
+
+# Dimension columns stored as categoricals
+CATEGORICAL_COLUMNS = ['campaign ID', 'Campaign Name', 'Age', 'Audience', 'Geography']
+
+# Count columns, stored as int32 (float32 when the column has gaps)
+COUNT_COLUMNS = ['Reach', 'Impressions', 'Clicks']
+
+
+def clean_geography(x):
+    # Clean geography names for better readability
+    return ('Multi-Country Group 1' if 'Group 1' in str(x) else
+            'Multi-Country Group 2' if 'Group 2' in str(x) else
+            str(x).split(',')[0] if ',' not in str(x) else str(x))
+
+
+def map_distinct(values, func):
+    # Apply `func` once per distinct value (missing values included, like apply
+    # would) and broadcast the results back to every row through categorical codes
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    mapped = pd.Index([func(value) for value in uniques])
+    categories = pd.Index(sorted(mapped.unique()))
+    return pd.Categorical.from_codes(categories.get_indexer(mapped)[codes], categories=categories)
+
+
+def parse_currency(values):
+    # '$1,234.50' -> 1234.5; columns the CSV reader already parsed as numbers pass through
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(np.float32)
+    text = values.astype(str) if isinstance(values.dtype, pd.CategoricalDtype) else values
+    return text.str.replace('$', '', regex=False).str.replace(',', '', regex=False).astype(np.float32)
+
+
+def compact_counts(values):
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values)
+    if values.isna().any():
+        return values.astype(np.float32)
+    return values.astype(np.int32)
+
+
+def clean(df):
+    # Clean whichever of the export's columns `df` has; a cleaned column is
+    # only derived when its source column was read
+    rows = len(df)
+    with profiler.stage('clean', rows=rows):
+        # Dimensions become categoricals (a no-op for columns the reader already typed)
+        with profiler.stage('clean.categoricals', rows=rows):
+            for column in CATEGORICAL_COLUMNS:
+                if column in df:
+                    df[column] = df[column].astype('category')
+
+        # Clean Amount Spent and Cost Per Click
+        with profiler.stage('clean.currency', rows=rows):
+            if 'Amount Spent in INR' in df:
+                df['Amount Spent in INR'] = parse_currency(df['Amount Spent in INR'])
+            if 'Cost Per Click (CPC)' in df:
+                df['CPC_Clean'] = parse_currency(df['Cost Per Click (CPC)'])
+
+        # Clean geography names, once per distinct geography
+        with profiler.stage('clean.geography', rows=rows):
+            if 'Geography' in df:
+                df['Geography_Clean'] = map_distinct(df['Geography'], clean_geography)
+
+        # Compact measures
+        with profiler.stage('clean.measures', rows=rows):
+            for column in COUNT_COLUMNS:
+                if column in df:
+                    df[column] = compact_counts(df[column])
+            if 'Click-Through Rate (CTR in %)' in df:
+                df['Click-Through Rate (CTR in %)'] = df['Click-Through Rate (CTR in %)'].astype(np.float32)
+    return df
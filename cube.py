@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from profiling import profiler
+
+# Finest grain of the cube - every table in the report is a rollup of these dimensions
+CUBE_DIMENSIONS = ['campaign ID', 'Campaign Name', 'Age', 'Audience', 'Geography_Clean']
+
+# Additive base measures, summed once at the finest grain
+SUM_MEASURES = ['Reach', 'Impressions', 'Clicks', 'Amount Spent in INR']
+
+# Averaged columns are stored as (sum, count) pairs so they stay additive under rollup
+MEAN_MEASURES = {
+    'Click-Through Rate (CTR in %)': ('CTR_sum', 'CTR_count'),
+    'CPC_Clean': ('CPC_sum', 'CPC_count'),
+}
+
+# Cleaned columns the cube is built from
+CUBE_COLUMNS = CUBE_DIMENSIONS + SUM_MEASURES + list(MEAN_MEASURES)
+
+
+def cube_dimensions(frame):
+    # The cube dimensions present in `frame`; a cube built from a subset of
+    # CUBE_COLUMNS only has the dimensions and measures it was given
+    return [dim for dim in CUBE_DIMENSIONS if dim in frame.columns]
+
+
+def build_cube(df, row_offset=0):
+    # One scan over the cleaned frame: sums, (sum, count) pairs for the averaged
+    # columns, row counts and the position of the first row in each cell
+    # (used to reproduce groupby(...).first() semantics after rollup)
+    with profiler.stage('cube.build', rows=len(df)):
+        dims = cube_dimensions(df)
+        work = df.assign(_row=np.arange(row_offset, row_offset + len(df)))
+        for dim in dims:
+            # Categoricals read back from parquet keep their categories in order of
+            # appearance; sort them so rollups come out in the same order as for strings
+            if isinstance(work[dim].dtype, pd.CategoricalDtype):
+                work[dim] = work[dim].cat.reorder_categories(sorted(work[dim].cat.categories))
+        for column in CUBE_COLUMNS[len(CUBE_DIMENSIONS):]:
+            # Measures may be stored as float32; accumulate them in float64
+            if column in work.columns and work[column].dtype == np.float32:
+                work[column] = work[column].astype(np.float64)
+        aggregations = {measure: (measure, 'sum') for measure in SUM_MEASURES if measure in work.columns}
+        for column, (sum_name, count_name) in MEAN_MEASURES.items():
+            if column in work.columns:
+                aggregations[sum_name] = (column, 'sum')
+                aggregations[count_name] = (column, 'count')
+        aggregations['rows'] = ('_row', 'size')
+        aggregations['first_row'] = ('_row', 'min')
+        return work.groupby(dims, dropna=False, observed=True, sort=False).agg(**aggregations).reset_index()
+
+
+def merge_cubes(cubes):
+    # Fold partial cubes (e.g. one per chunk or per delta file) into a single cube
+    with profiler.stage('cube.merge'):
+        for dim in cube_dimensions(cubes[0]):
+            # Partial cubes have the categories of their own rows; concat would
+            # turn categoricals with different categories into strings
+            categories = [cube[dim].cat.categories for cube in cubes
+                          if isinstance(cube[dim].dtype, pd.CategoricalDtype)]
+            if any(not other.equals(categories[0]) for other in categories[1:]):
+                union = sorted(set().union(*categories))
+                cubes = [cube.assign(**{dim: pd.Categorical(cube[dim], categories=union)}) for cube in cubes]
+        combined = pd.concat(cubes, ignore_index=True)
+        measures = [c for c in combined.columns if c not in CUBE_DIMENSIONS]
+        agg = {c: 'min' if c == 'first_row' else 'sum' for c in measures}
+        return combined.groupby(cube_dimensions(combined), dropna=False, observed=True, sort=False).agg(agg).reset_index()
+
+
+def rollup(cube, dims, dropna=True):
+    # Roll the cube up to `dims`; rows with a missing key are dropped by default,
+    # the same way df.groupby(dims) would drop them on the raw frame
+    dims = [dims] if isinstance(dims, str) else list(dims)
+    measures = [c for c in cube.columns if c not in CUBE_DIMENSIONS]
+    agg = {c: 'min' if c == 'first_row' else 'sum' for c in measures}
+    rolled = cube.groupby(dims, dropna=dropna, observed=True).agg(agg)
+    for column, (sum_name, count_name) in MEAN_MEASURES.items():
+        if sum_name in rolled.columns:
+            rolled[column] = rolled[sum_name] / rolled[count_name]
+    return rolled
+
+
+def first_values(cube, dims, columns):
+    # Equivalent of df.groupby(dims)[columns].first() on the raw frame: cells are
+    # ordered by the first raw row they contain, and first() skips nulls per column
+    dims = [dims] if isinstance(dims, str) else list(dims)
+    return cube.sort_values('first_row').groupby(dims, observed=True)[columns].first()
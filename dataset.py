@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from ingest import load_frame
+from profiling import profiler
+
+# Row-level access to the cleaned export through inverted indexes: for every
+# indexed dimension the row positions are grouped by value once, so a filtered
+# slice costs time proportional to the rows it returns instead of a scan of
+# the whole frame
+
+INDEX_COLUMNS = ['campaign ID', 'Age', 'Audience', 'Geography_Clean']
+
+
+class DimensionIndex:
+    # Row positions of one column grouped by value: positions[offsets[i]:offsets[i + 1]]
+    # are the ascending rows holding values[i - 1], with missing values in slot 0
+
+    def __init__(self, column):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, self.values = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, self.values = pd.factorize(column, sort=True)
+        dtype = np.int32 if len(column) < 2 ** 31 else np.int64
+        # Small integer keys make the stable argsort a linear-time radix sort
+        slots = codes.astype(np.min_scalar_type(-len(self.values) - 1)) + 1
+        self.positions = np.argsort(slots, kind='stable').astype(dtype)
+        self.offsets = np.zeros(len(self.values) + 2, dtype=np.int64)
+        np.cumsum(np.bincount(slots, minlength=len(self.values) + 1), out=self.offsets[1:])
+
+    def slots(self, values):
+        # Slot of each value (0 for missing); values not in the column are left out
+        values = list(values)
+        missing = pd.isna(pd.Series(values, dtype=object)).to_numpy()
+        found = self.values.get_indexer([v for v, m in zip(values, missing) if not m])
+        return np.concatenate([np.zeros(int(missing.any()), dtype=np.int64), found[found >= 0] + 1])
+
+    def lookup(self, values):
+        # Ascending row positions holding any of `values`
+        slots = np.unique(self.slots(values))
+        parts = [self.positions[self.offsets[s]:self.offsets[s + 1]] for s in slots]
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts)) if parts else self.positions[:0]
+
+    def count(self, values):
+        slots = np.unique(self.slots(values))
+        return int((self.offsets[slots + 1] - self.offsets[slots]).sum())
+
+
+def intersect(sorted_positions):
+    # Intersection of ascending position arrays. Each candidate from the smallest
+    # array is binary-searched in the others, so the cost grows with the size of
+    # the smallest array, not of the largest
+    sorted_positions = sorted(sorted_positions, key=len)
+    result = sorted_positions[0]
+    for other in sorted_positions[1:]:
+        if not len(result) or not len(other):
+            return result[:0]
+        found = np.searchsorted(other, result).clip(max=len(other) - 1)
+        result = result[other[found] == result]
+    return result
+
+
+class Dataset:
+
+    def __init__(self, df, index_columns=None):
+        self.df = df
+        self.index_columns = list(index_columns or INDEX_COLUMNS)
+        with profiler.stage('dataset.index', rows=len(df)):
+            self.indexes = {column: DimensionIndex(df[column]) for column in self.index_columns}
+
+    @classmethod
+    def load(cls, path, index_columns=None, use_cache=True):
+        return cls(load_frame(path, use_cache=use_cache), index_columns)
+
+    def __len__(self):
+        return len(self.df)
+
+    def positions(self, filters=None):
+        # Ascending positions of the rows matching every filter ({column: [values]},
+        # a single value may be given bare); None or NaN selects missing values
+        if not filters:
+            return np.arange(len(self.df))
+        unknown = [column for column in filters if column not in self.indexes]
+        if unknown:
+            raise ValueError(f"{', '.join(unknown)} not indexed; indexed columns are {', '.join(self.index_columns)}")
+        # Look up the most selective filter first so the intersection starts small
+        lists = [self.indexes[column].lookup(_as_list(values)) for column, values in
+                 sorted(filters.items(), key=lambda item: self.indexes[item[0]].count(_as_list(item[1])))]
+        return intersect(lists)
+
+    def count(self, filters=None):
+        return len(self.positions(filters))
+
+    def slice(self, filters=None, columns=None):
+        # Rows matching `filters`, in their original order
+        with profiler.stage('dataset.slice') as span:
+            frame = self.df if columns is None else self.df[columns]
+            result = frame.take(self.positions(filters))
+            span['rows'] = len(result)
+        return result
+
+
+def _as_list(values):
+    return [values] if isinstance(values, str) or not hasattr(values, '__iter__') else list(values)
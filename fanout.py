@@ -0,0 +1,141 @@
+import argparse
+import hashlib
+import os
+import re
+from collections import Counter
+
+from backends import available_backends, check_backend, load_cube
+from charts import render_charts, render_pool
+from insights import BACKEND, CHUNK_SIZE, DATA_FILE, DPI, OUTPUT_FORMAT, RENDER_WORKERS, USE_CACHE
+from planner import Plan, required_columns, select_charts
+from profiling import profiler
+from query import DIMENSIONS
+from store import AggregateStore
+
+# Per-partition chart packs: the report's chart set for every campaign ID (or
+# geography, age group, ...) in its own directory. The cube is split by the
+# partition dimension once and each worker process gets only its partition's
+# cells, a few kilobytes however many rows the export has, from which it
+# builds the tables and draws the charts
+
+OUTPUT_DIR = 'reports'
+
+
+def partition_dir(value):
+    # Directory name for a partition value, e.g. 'Multi-Country Group 1' -> 'Multi-Country_Group_1'
+    return re.sub(r'[^\w.-]+', '_', str(value)).strip('_') or '_'
+
+
+def partition_dirs(values):
+    # partition_dir of each value; values whose names collide (e.g. 'A B' and
+    # 'A_B') get a short hash of the value appended so no two share a directory
+    names = [partition_dir(value) for value in values]
+    counts = Counter(names)
+    return [name if counts[name] == 1 else f"{name}-{hashlib.sha256(str(value).encode()).hexdigest()[:8]}"
+            for name, value in zip(names, values)]
+
+
+def partitions(cube, column):
+    # (value, cube cells) per value of `column`; cells with a missing value are left out
+    for value, cells in cube.groupby(column, observed=True, sort=True):
+        cells = cells.reset_index(drop=True)
+        for dim in cells.columns[cells.dtypes == 'category']:
+            cells[dim] = cells[dim].cat.remove_unused_categories()
+        yield value, cells
+
+
+def render_partition(cells, output_dir, fmt='png', dpi=300, force=False, charts=None):
+    # Build one partition's tables and draw its charts (all of them by default) into output_dir. Charts
+    # whose table is empty for this partition (e.g. no campaign with more than
+    # 20 clicks) are skipped. Returns the rendered paths and the profiler spans
+    first_span = len(profiler.spans)
+    with profiler.stage(f'partition {os.path.basename(output_dir)}', rows=len(cells)):
+        jobs = [job for job in Plan(cells).jobs(charts) if len(job[2])]
+        paths = render_charts(jobs, output_dir=output_dir, fmt=fmt, dpi=dpi, workers=1, force=force)
+    return paths, profiler.spans[first_span:]
+
+
+def render_partitions(cube, column, output_dir=OUTPUT_DIR, fmt='png', dpi=300, workers=None, force=False,
+                      charts=None):
+    # Render the chart pack of every partition, one partition per task across a
+    # process pool. Returns {partition value: rendered paths}
+    with profiler.stage('partition.split', rows=len(cube)):
+        parts = list(partitions(cube, column))
+    directories = [os.path.join(output_dir, name) for name in partition_dirs([value for value, _ in parts])]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(parts))
+    if workers <= 1:
+        results = [render_partition(cells, directory, fmt, dpi, force, charts)
+                   for (_, cells), directory in zip(parts, directories)]
+    else:
+        with render_pool(workers) as pool:
+            futures = [pool.submit(render_partition, cells, directory, fmt, dpi, force, charts)
+                       for (_, cells), directory in zip(parts, directories)]
+            results = [future.result() for future in futures]
+        for _, spans in results:
+            profiler.extend(spans)
+    return {value: paths for (value, _), (paths, _) in zip(parts, results)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write the report chart set once per campaign ID, geography or other dimension value.')
+    parser.add_argument('data_file', nargs='?', default=DATA_FILE, help='campaign export CSV')
+    parser.add_argument('--by', default='campaign_id', choices=sorted(DIMENSIONS),
+                        help='dimension to partition by')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help='charts go to <output-dir>/<by>/<value>/')
+    parser.add_argument('--charts', nargs='+', default=None, metavar='NAME',
+                        help='only build these charts (names or shell patterns); see insights.py --list-charts')
+    parser.add_argument('--format', default=OUTPUT_FORMAT, choices=['png', 'jpg', 'svg', 'pdf'],
+                        help='chart file format')
+    parser.add_argument('--dpi', type=int, default=DPI, help='chart resolution')
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS,
+                        help='processes rendering partitions (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='stream the CSV in chunks of this many rows')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', default=USE_CACHE,
+                        help='ignore and do not write the parquet cache')
+    parser.add_argument('--backend', default=BACKEND, choices=available_backends(),
+                        help='engine that aggregates the data (duckdb and polars, when installed, run out of core)')
+    parser.add_argument('--store', default=None,
+                        help='partition the aggregate store built by store.py instead of reading data_file')
+    parser.add_argument('--force', action='store_true',
+                        help='redraw every chart, even those whose data has not changed')
+    parser.add_argument('--profile', action='store_true',
+                        help='print wall time, CPU time, rows and memory change for every stage')
+    args = parser.parse_args(argv)
+    try:
+        charts = select_charts(args.charts)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.store and not AggregateStore(args.store).exists():
+        parser.error(f'{args.store} holds no aggregate store yet; build it with store.py')
+    if not args.store:
+        try:
+            check_backend(args.backend, args.use_cache)
+        except ValueError as error:
+            parser.error(str(error))
+    if args.profile:
+        profiler.enable()
+
+    with profiler.stage('load') as span:
+        if args.store:
+            cube = AggregateStore(args.store).load_cube()
+        else:
+            cube = load_cube(args.data_file, backend=args.backend, chunksize=args.chunk_size,
+                             use_cache=args.use_cache,
+                             columns=required_columns(charts) + [DIMENSIONS[args.by]] if args.charts else None)
+        span['rows'] = int(cube['rows'].sum())
+    output_dir = os.path.join(args.output_dir, args.by)
+    rendered = render_partitions(cube, DIMENSIONS[args.by], output_dir=output_dir, fmt=args.format,
+                                 dpi=args.dpi, workers=args.workers, force=args.force, charts=charts)
+    print(f"Rendered {sum(map(len, rendered.values()))} charts for {len(rendered)} partitions into {output_dir}")
+
+    if profiler.enabled:
+        print("\n" + profiler.summary())
+
+
+if __name__ == '__main__':
+    main()
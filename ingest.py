@@ -0,0 +1,101 @@
+import pandas as pd
+
+from cache import CacheWriter, cache_available, cache_path, is_fresh, iter_cached, read_cached
+from cleaning import CATEGORICAL_COLUMNS, clean
+from cube import CUBE_COLUMNS, build_cube, merge_cubes
+from profiling import profiler
+
+# Columns of the export the analysis actually reads
+RAW_COLUMNS = [
+    'campaign ID', 'Campaign Name', 'Age', 'Audience', 'Geography',
+    'Reach', 'Impressions', 'Clicks', 'Amount Spent in INR',
+    'Cost Per Click (CPC)', 'Click-Through Rate (CTR in %)',
+]
+
+# Reporting-date column of the export (Ads Manager calls it 'Reporting starts'),
+# read only by the stores
+DATE_COLUMN = 'Reporting starts'
+
+# Parse dimension columns straight into categoricals (and as strings in every chunk)
+DIMENSION_DTYPES = {column: 'category' for column in CATEGORICAL_COLUMNS}
+
+# Export columns the cleaned columns that are not read as-is are derived from
+CLEANED_FROM = {'CPC_Clean': 'Cost Per Click (CPC)', 'Geography_Clean': 'Geography'}
+
+
+def raw_columns(columns=None, write_cache=False):
+    # Export columns to read for the cleaned `columns`; all of them when the
+    # parquet cache, which holds every cleaned column, is being written
+    if columns is None or write_cache:
+        return RAW_COLUMNS
+    wanted = {CLEANED_FROM.get(column, column) for column in columns}
+    return [column for column in RAW_COLUMNS if column in wanted]
+
+
+def load_frame(path, columns=None, use_cache=True):
+    # Load the cleaned export. A fresh parquet cache is read directly (only the
+    # requested columns); otherwise the CSV is parsed, cleaned and cached
+    cache_file = cache_path(path)
+    if use_cache and is_fresh(path, cache_file):
+        with profiler.stage('load.read_cache') as span:
+            df = read_cached(cache_file, columns=columns)
+            span['rows'] = len(df)
+        return df
+
+    write_cache = use_cache and cache_available()
+    with profiler.stage('load.read_csv') as span:
+        df = pd.read_csv(path, usecols=raw_columns(columns, write_cache), dtype=DIMENSION_DTYPES)
+        span['rows'] = len(df)
+    df = clean(df)
+    if write_cache:
+        with profiler.stage('load.write_cache', rows=len(df)):
+            writer = CacheWriter(path, cache_file)
+            writer.write(df)
+            writer.close()
+    return df if columns is None else df[columns]
+
+
+def iter_clean_chunks(path, chunksize, columns=None, use_cache=True):
+    # Yield cleaned chunks of at most `chunksize` rows, from the cache when it is
+    # fresh and from the CSV otherwise (writing the cache as the chunks go by)
+    cache_file = cache_path(path)
+    if use_cache and is_fresh(path, cache_file):
+        yield from profiler.iterate(iter_cached(cache_file, chunksize, columns=columns), 'load.read_cache')
+        return
+
+    writer = CacheWriter(path, cache_file) if use_cache and cache_available() else None
+    reader = pd.read_csv(path, usecols=raw_columns(columns, writer is not None), dtype=DIMENSION_DTYPES,
+                         chunksize=chunksize)
+    try:
+        for chunk in profiler.iterate(reader, 'load.read_csv'):
+            chunk = clean(chunk)
+            if writer is not None:
+                with profiler.stage('load.write_cache', rows=len(chunk)):
+                    writer.write(chunk)
+            yield chunk if columns is None else chunk[columns]
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+
+
+def load_cube(path, chunksize=None, use_cache=True, columns=None):
+    # Build the aggregation cube for `path`. With a chunksize the file is streamed:
+    # each chunk is cleaned, reduced to a partial cube and folded into the running
+    # cube, so peak memory depends on the chunk size and the number of distinct
+    # campaign/age/audience/geography cells, not on the size of the file.
+    # `columns` narrows the cube to a subset of CUBE_COLUMNS; only those are read
+    # from the parquet cache
+    columns = [column for column in CUBE_COLUMNS if column in (columns or CUBE_COLUMNS)]
+    if chunksize is None:
+        return build_cube(load_frame(path, columns=columns, use_cache=use_cache))
+
+    cube = None
+    rows_seen = 0
+    for chunk in iter_clean_chunks(path, chunksize, columns=columns, use_cache=use_cache):
+        partial = build_cube(chunk, row_offset=rows_seen)
+        rows_seen += len(chunk)
+        cube = partial if cube is None else merge_cubes([cube, partial])
+    return cube
@@ -0,0 +1,100 @@
+from fnmatch import fnmatchcase
+
+from cube import CUBE_COLUMNS
+from rollups import RollupCache
+
+# Declarative report definition. Tables are registered with the cube columns
+# their rollups read and the tables they are derived from; charts are
+# registered with the table they draw. A Plan builds tables lazily, each at
+# most once and with rollups shared through a RollupCache, so asking for some
+# of the charts only loads the columns and builds the tables those charts need
+
+TABLES = {}
+CHARTS = {}
+
+
+class TableSpec:
+
+    def __init__(self, name, build, columns, needs):
+        self.name = name
+        self.build = build
+        self.columns = list(columns)
+        self.needs = list(needs)
+
+
+class ChartSpec:
+
+    def __init__(self, name, draw, table, options):
+        self.name = name
+        self.draw = draw
+        self.table = table
+        self.options = options
+
+
+def register_table(columns=(), needs=(), name=None):
+    # Decorator registering build(plan) -> DataFrame as a table, named after the
+    # function unless `name` is given
+    def register(build):
+        TABLES[name or build.__name__] = TableSpec(name or build.__name__, build, columns, needs)
+        return build
+    return register
+
+
+def register_chart(name, draw, table, **options):
+    # draw(table, path, dpi=..., **options) renders chart `name` from table `table`
+    CHARTS[name] = ChartSpec(name, draw, table, options)
+
+
+def select_charts(patterns=None):
+    # Registered chart names matching any of the shell-style `patterns`, in
+    # registration order; every chart when no patterns are given
+    if not patterns:
+        return list(CHARTS)
+    unmatched = [pattern for pattern in patterns if not any(fnmatchcase(name, pattern) for name in CHARTS)]
+    if unmatched:
+        raise ValueError(f"no chart matches {', '.join(unmatched)}")
+    return [name for name in CHARTS if any(fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+def required_tables(chart_names):
+    # Tables the charts draw plus everything they are derived from
+    required, pending = [], [CHARTS[name].table for name in chart_names]
+    while pending:
+        name = pending.pop()
+        if name not in required:
+            required.append(name)
+            pending.extend(TABLES[name].needs)
+    return required
+
+
+def required_columns(chart_names):
+    # Cube columns the charts' tables read, in CUBE_COLUMNS order
+    columns = {column for name in required_tables(chart_names) for column in TABLES[name].columns}
+    return [column for column in CUBE_COLUMNS if column in columns]
+
+
+class Plan:
+
+    def __init__(self, cube, rollups=None):
+        self.cube = cube
+        self.rollups = rollups or RollupCache()
+        self.built = {}
+
+    def rollup(self, dims):
+        return self.rollups.rollup(self.cube, dims)
+
+    def first_values(self, dims, columns):
+        return self.rollups.first_values(self.cube, dims, columns)
+
+    def table(self, name):
+        if name not in self.built:
+            self.built[name] = TABLES[name].build(self)
+        return self.built[name]
+
+    def tables(self, names=None):
+        return {name: self.table(name) for name in (TABLES if names is None else names)}
+
+    def jobs(self, chart_names=None):
+        # (chart, output name, table, options) render jobs for the charts
+        return [(CHARTS[name].draw, name, self.table(CHARTS[name].table), CHARTS[name].options)
+                for name in (CHARTS if chart_names is None else chart_names)]
@@ -0,0 +1,138 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Stage-level instrumentation. Code wraps its stages in `profiler.stage(...)`;
+# while the profiler is disabled (the default) that is a no-op, and while it is
+# enabled each stage costs a handful of clock reads and one read of
+# /proc/self/statm, so it can stay on in production runs
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def _rss_bytes():
+    # Current resident set size on Linux; peak RSS where /proc is not available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.stack = []
+        self.origin_ns = time.time_ns()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.origin_ns = time.time_ns()
+
+    def reset(self):
+        self.spans = []
+        self.stack = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # Time the body of the with block. The yielded dict can be used to set
+        # 'rows' once the number of rows processed is known
+        if not self.enabled:
+            yield {}
+            return
+        span = {'name': name, 'rows': rows, 'path': self.stack + [name]}
+        self.stack.append(name)
+        rss = _rss_bytes()
+        cpu = time.process_time_ns()
+        start = time.perf_counter_ns()
+        span['ts_ns'] = time.time_ns()
+        try:
+            yield span
+        finally:
+            span['wall_ns'] = time.perf_counter_ns() - start
+            span['cpu_ns'] = time.process_time_ns() - cpu
+            span['mem_delta'] = _rss_bytes() - rss
+            span['pid'] = os.getpid()
+            span['tid'] = threading.get_ident()
+            self.stack.pop()
+            self.spans.append(span)
+
+    def iterate(self, iterable, name):
+        # Time every step of `iterable` as a separate `name` stage (e.g. each
+        # chunk a CSV reader parses), recording the length of each item as its rows
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as span:
+                item = next(iterator, None)
+                if item is not None and hasattr(item, '__len__'):
+                    span['rows'] = len(item)
+            if item is None:
+                return
+            yield item
+
+    def extend(self, spans):
+        # Add spans recorded in another process (e.g. a chart render worker),
+        # nested under the stage that is currently open
+        for span in spans:
+            self.spans.append(dict(span, path=self.stack + span['path']))
+
+    def summary(self):
+        # Spans with the same path aggregated into one row, printed as a tree
+        # with siblings in the order they first started
+        totals = {}
+        for span in sorted(self.spans, key=lambda s: s['ts_ns']):
+            total = totals.setdefault(tuple(span['path']),
+                                      {'calls': 0, 'wall_ns': 0, 'cpu_ns': 0, 'rows': 0, 'mem_delta': 0})
+            total['calls'] += 1
+            total['wall_ns'] += span['wall_ns']
+            total['cpu_ns'] += span['cpu_ns']
+            total['rows'] += span['rows'] or 0
+            total['mem_delta'] += span['mem_delta']
+
+        children = {}
+        for path in totals:
+            children.setdefault(path[:-1], []).append(path)
+        lines = [f"{'stage':<44}{'calls':>7}{'wall s':>10}{'cpu s':>10}{'rows':>14}{'mem Δ MB':>11}"]
+
+        def add(parent):
+            for path in children.get(parent, []):
+                total = totals[path]
+                label = ('  ' * (len(path) - 1) + path[-1])[:43]
+                lines.append(f"{label:<44}{total['calls']:>7}{total['wall_ns'] / 1e9:>10.3f}"
+                             f"{total['cpu_ns'] / 1e9:>10.3f}{total['rows']:>14,}"
+                             f"{total['mem_delta'] / 1024 ** 2:>+11.1f}")
+                add(path)
+
+        add(())
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        # Chrome trace-event JSON (chrome://tracing, Perfetto, speedscope)
+        main_pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                   'args': {'name': 'main' if pid == main_pid else f'worker {pid}'}}
+                  for pid in sorted({span['pid'] for span in self.spans})]
+        for span in self.spans:
+            events.append({
+                'name': span['name'], 'cat': 'stage', 'ph': 'X',
+                'ts': (span['ts_ns'] - self.origin_ns) / 1000, 'dur': span['wall_ns'] / 1000,
+                'pid': span['pid'], 'tid': span['tid'],
+                'args': {'rows': span['rows'], 'cpu_ms': span['cpu_ns'] / 1e6,
+                         'mem_delta_mb': span['mem_delta'] / 1024 ** 2},
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+# The process-wide profiler every module records into
+profiler = Profiler()
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from cube import CUBE_DIMENSIONS, rollup
+
+# Parameterized group-by / filter / metric queries over the cube, with the
+# same metric definitions the report uses
+
+# Query names for the cube dimensions
+DIMENSIONS = {
+    'campaign_id': 'campaign ID',
+    'campaign_name': 'Campaign Name',
+    'age': 'Age',
+    'audience': 'Audience',
+    'geography': 'Geography_Clean',
+}
+
+# Every metric is computed from the summed measures of a rollup
+METRICS = {
+    'rows': lambda t: t['rows'],
+    'reach': lambda t: t['Reach'],
+    'impressions': lambda t: t['Impressions'],
+    'clicks': lambda t: t['Clicks'],
+    'spend': lambda t: t['Amount Spent in INR'],
+    # CTR as Clicks / Impressions, and the mean of the export's per-row CTR column
+    'ctr': lambda t: t['Clicks'] / t['Impressions'] * 100,
+    'avg_ctr': lambda t: t['CTR_sum'] / t['CTR_count'],
+    # CPC as Spend / Clicks, and the mean of the export's per-row CPC column
+    'cpc': lambda t: t['Amount Spent in INR'] / t['Clicks'],
+    'avg_cpc': lambda t: t['CPC_sum'] / t['CPC_count'],
+    'cpm': lambda t: t['Amount Spent in INR'] / t['Impressions'] * 1000,
+    # ROI as clicks per ₹1000 spent
+    'roi': lambda t: t['Clicks'] / t['Amount Spent in INR'] * 1000,
+}
+
+DEFAULT_METRICS = ['reach', 'impressions', 'clicks', 'spend', 'ctr', 'cpc', 'cpm', 'roi']
+
+
+def _dimension(name):
+    if name not in DIMENSIONS:
+        raise ValueError(f"unknown dimension {name}; expected one of {', '.join(DIMENSIONS)}")
+    return DIMENSIONS[name]
+
+
+def filter_cube(cube, filters):
+    # Keep the cube cells matching every filter ({dimension name: [values]})
+    mask = np.ones(len(cube), dtype=bool)
+    for name, values in filters.items():
+        mask &= cube[_dimension(name)].isin(list(values)).to_numpy()
+    return cube[mask]
+
+
+def run_query(cube, group_by=(), filters=None, metrics=None, sort=None, limit=None, rollups=None):
+    # Roll the (filtered) cube up to `group_by` and compute `metrics` per group.
+    # `sort` names a metric or dimension, with a leading '-' for descending order.
+    # Grouped rollups go through `rollups` (a RollupCache) when one is given.
+    # Returns a DataFrame with one column per dimension and metric
+    group_by = list(group_by)
+    metrics = list(metrics or DEFAULT_METRICS)
+    dims = [_dimension(name) for name in group_by]
+    unknown = [name for name in metrics if name not in METRICS]
+    if unknown:
+        raise ValueError(f"unknown metric {', '.join(unknown)}; expected one of {', '.join(METRICS)}")
+
+    filters = filters or {}
+    if dims and rollups is not None:
+        rolled = rollups.rollup(cube, dims, {_dimension(name): values for name, values in filters.items()})
+    elif dims:
+        rolled = rollup(filter_cube(cube, filters), dims)
+    else:
+        cells = filter_cube(cube, filters)
+        # Grand total as a single group, keeping the measures' dtypes
+        measures = [c for c in cells.columns if c not in CUBE_DIMENSIONS]
+        rolled = cells[measures].groupby(np.zeros(len(cells), dtype=np.int8)).sum()
+
+    result = pd.DataFrame({name: METRICS[name](rolled) for name in metrics}, index=rolled.index)
+    result = result.replace([np.inf, -np.inf], np.nan)
+    result = result.reset_index(drop=not dims)
+    result = result.rename(columns={column: name for name, column in zip(group_by, dims)})
+    for name in group_by:
+        result[name] = result[name].astype(str)
+
+    if sort:
+        key = sort.lstrip('-')
+        if key not in result.columns:
+            raise ValueError(f'cannot sort by {key}; it is not a requested metric or dimension')
+        result = result.sort_values(key, ascending=not sort.startswith('-'), kind='stable')
+    if limit is not None:
+        result = result.head(limit)
+    return result.reset_index(drop=True)
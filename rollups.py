@@ -0,0 +1,187 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from cube import first_values, rollup
+from profiling import profiler
+
+# Memoized rollups of the cube. Results are keyed by (data version, group-by
+# dimensions, filters) and kept in a size-bounded LRU in memory, optionally
+# backed by pickles on disk so later runs over the same data reuse them.
+# A rollup that is not cached but is coarser than a cached one (e.g. by
+# campaign ID when campaign ID x Age is cached) is rolled up from the cached
+# result instead of from the cube, which is valid because every measure in
+# the cube is additive
+
+# Subdirectory of the parquet cache directory the disk tier is kept in
+ROLLUP_DIR = 'rollups'
+
+# Rollup files kept on disk before the least recently used are removed
+MAX_FILES = 256
+
+# Bump when cube.rollup() or cube.first_values() change so rollups on disk are recomputed
+ROLLUP_VERSION = 1
+
+
+def cube_version(cube):
+    # Content hash of the cube, so the version changes exactly when the data does
+    digest = hashlib.sha256(repr(list(cube.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(cube, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _filter_key(filters):
+    return tuple(sorted((column, tuple(sorted(set(values), key=repr))) for column, values in (filters or {}).items()))
+
+
+def _keep(frame, filters):
+    # Rows of `frame` matching every filter ({column: [values]})
+    mask = pd.Series(True, index=frame.index)
+    for column, values in filters:
+        mask &= frame[column].isin(list(values))
+    return frame[mask]
+
+
+def _drop_missing_keys(rolled):
+    return rolled[rolled.index.to_frame(index=False).notna().all(axis=1).to_numpy()]
+
+
+class LRUCache:
+    # Size-bounded mapping that evicts the least recently used entry; not
+    # thread-safe on its own
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def items(self):
+        return list(self.entries.items())
+
+    def clear(self):
+        self.entries.clear()
+
+
+class RollupCache:
+
+    def __init__(self, maxsize=64, path=None, max_files=MAX_FILES):
+        self.path = path
+        self.max_files = max_files
+        self.entries = LRUCache(maxsize)
+        self.stats = {'memory': 0, 'disk': 0, 'derived': 0, 'computed': 0}
+        self._versioned = (None, None)
+        # Entries are shared by the threads of the query service
+        self.lock = threading.Lock()
+
+    def version(self, cube):
+        # Hashing is cheap next to a rollup, but skip it when asked about the same cube again
+        if self._versioned[0] is not cube:
+            self._versioned = (cube, cube_version(cube))
+        return self._versioned[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._versioned = (None, None)
+
+    def rollup(self, cube, dims, filters=None, dropna=True):
+        # Same result as cube.rollup() on the cube cells matching `filters`
+        # ({cube column: [values]}). Entries keep their missing-key groups so
+        # they can be rolled up further; they are dropped on the way out
+        dims = (dims,) if isinstance(dims, str) else tuple(dims)
+        filters = _filter_key(filters)
+        key = ('rollup', self.version(cube), dims, filters)
+        rolled = self._get(key)
+        if rolled is None:
+            rolled = self._derive(key)
+            if rolled is None:
+                with profiler.stage('rollup', rows=len(cube)):
+                    rolled = rollup(_keep(cube, filters), list(dims), dropna=False)
+                self.stats['computed'] += 1
+            self._put(key, rolled)
+        return _drop_missing_keys(rolled) if dropna else rolled.copy()
+
+    def first_values(self, cube, dims, columns):
+        dims = (dims,) if isinstance(dims, str) else tuple(dims)
+        key = ('first', self.version(cube), dims, tuple(columns))
+        values = self._get(key)
+        if values is None:
+            values = first_values(cube, list(dims), list(columns))
+            self.stats['computed'] += 1
+            self._put(key, values)
+        return values.copy()
+
+    def _derive(self, key):
+        # Roll up the smallest cached result grouped by a superset of the wanted
+        # dimensions whose filters are a subset of the wanted ones, applying the
+        # remaining filters first (possible when they are on its dimensions)
+        kind, version, dims, filters = key
+        candidates = []
+        with self.lock:
+            entries = self.entries.items()
+        for (other_kind, other_version, other_dims, other_filters), rolled in entries:
+            extra = [f for f in filters if f not in other_filters]
+            if (other_kind == kind and other_version == version and set(dims) <= set(other_dims)
+                    and set(other_filters) <= set(filters) and all(column in other_dims for column, _ in extra)):
+                candidates.append((len(rolled), other_dims, extra, rolled))
+        if not candidates:
+            return None
+        _, other_dims, extra, rolled = min(candidates, key=lambda candidate: candidate[0])
+        with profiler.stage('rollup.derived', rows=len(rolled)):
+            derived = rollup(_keep(rolled.reset_index(), extra), list(dims), dropna=False)
+        self.stats['derived'] += 1
+        return derived
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha256(repr((ROLLUP_VERSION, key)).encode()).hexdigest()[:32] + '.pkl')
+
+    def _get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+        if value is not None:
+            self.stats['memory'] += 1
+            return value
+        if self.path is None:
+            return None
+        try:
+            with open(self._file(key), 'rb') as f:
+                value = pickle.load(f)
+            os.utime(self._file(key))
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        self.stats['disk'] += 1
+        self._remember(key, value)
+        return value
+
+    def _remember(self, key, value):
+        with self.lock:
+            self.entries.put(key, value)
+
+    def _put(self, key, value):
+        self._remember(key, value)
+        if self.path is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        path = self._file(key)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+        files = sorted((entry for entry in os.scandir(self.path) if entry.name.endswith('.pkl')),
+                       key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in files[:max(0, len(files) - self.max_files)]:
+            os.remove(entry.path)
@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from backends import available_backends, check_backend, load_cube
+from charts import chart_fingerprint, render_bytes, render_pool
+from cube import CUBE_COLUMNS, build_cube
+from dataset import Dataset
+from insights import BACKEND, DATA_FILE, build_tables, chart_jobs
+from query import DIMENSIONS, METRICS, run_query
+from rollups import LRUCache, RollupCache
+from store import AggregateStore
+
+# Local query service: loads the cube once and answers metric queries and chart
+# requests over HTTP without re-running the report. Queries run on a thread
+# pool and charts on a process pool, so the asyncio loop only does the I/O.
+#
+#   GET /query?group_by=age&campaign_id=<id>&metrics=ctr,cpc&sort=-ctr&limit=10
+#   GET /charts                          names of the report's charts
+#   GET /chart/<name>?format=png&dpi=100 one chart, rendered on demand
+#   GET /rows?campaign_id=<id>&age=18-24&limit=100  matching raw rows (with --rows)
+#   GET /dimensions, /metrics, /health
+#   POST /reload                         reload the data and drop cached results
+
+CONTENT_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryService:
+
+    def __init__(self, data_file=DATA_FILE, store=None, chunksize=None, use_cache=True,
+                 workers=None, cache_size=256, rows=False, backend=BACKEND):
+        self.data_file = data_file
+        self.backend = backend
+        self.store = store
+        self.chunksize = chunksize
+        self.use_cache = use_cache
+        # Keep the cleaned rows and their dimension indexes in memory for /rows
+        self.rows = rows
+        self.dataset = None
+        self.results = LRUCache(cache_size)
+        self.rollups = RollupCache(maxsize=cache_size)
+        self.query_pool = ThreadPoolExecutor(max_workers=workers)
+        # Workers start on the first chart request, when query threads may hold
+        # locks (the rollup cache's, malloc's) that a forked child would inherit
+        # held; start them from a fresh process instead
+        self.render_pool = render_pool(workers, mp_context=get_context(
+            'forkserver' if 'forkserver' in get_all_start_methods() else 'spawn'))
+        self.version = 0
+        self.load()
+
+    def load(self):
+        dataset = None
+        if self.store:
+            cube = AggregateStore(self.store).load_cube()
+        elif self.rows:
+            dataset = Dataset.load(self.data_file, use_cache=self.use_cache)
+            cube = build_cube(dataset.df[CUBE_COLUMNS])
+        else:
+            cube = load_cube(self.data_file, backend=self.backend, chunksize=self.chunksize,
+                             use_cache=self.use_cache)
+        self.rollups.clear()
+        tables = build_tables(cube, self.rollups)
+        # Swap everything in at once so concurrent requests see one version
+        self.cube, self.dataset, self.jobs = cube, dataset, {job[1]: job for job in chart_jobs(tables)}
+        self.version += 1
+
+    def close(self):
+        self.query_pool.shutdown()
+        self.render_pool.shutdown()
+
+    def query(self, params):
+        # Every parameter that is not a query option is a dimension filter, matching
+        # any of its values when repeated. Filter values are taken as given, since
+        # geographies and campaign names may contain commas; the names in group_by
+        # and metrics may also be comma-separated
+        options = {'group_by', 'metrics', 'sort', 'limit'}
+        split = {key: [v for value in params.get(key, []) for v in value.split(',') if v]
+                 for key in ('group_by', 'metrics')}
+        try:
+            limit = int(params['limit'][0]) if 'limit' in params else None
+        except ValueError:
+            raise HTTPError(400, 'limit must be an integer')
+        try:
+            result = run_query(self.cube,
+                               group_by=split.get('group_by', []),
+                               filters={key: values for key, values in params.items() if key not in options},
+                               metrics=split.get('metrics') or None,
+                               sort=params['sort'][0] if 'sort' in params else None,
+                               limit=limit,
+                               rollups=self.rollups)
+        except ValueError as error:
+            raise HTTPError(400, str(error))
+        return ('{"version": %d, "rows": %s}' % (self.version, result.to_json(orient='records'))).encode()
+
+    def matching_rows(self, params):
+        # Raw rows matching the dimension filters, found through the dataset's indexes
+        if self.dataset is None:
+            raise HTTPError(404, 'start the server with --rows to query raw rows')
+        try:
+            limit = int(params.get('limit', ['100'])[0])
+        except ValueError:
+            raise HTTPError(400, 'limit must be an integer')
+        filters = {}
+        for key, values in params.items():
+            if key != 'limit':
+                if DIMENSIONS.get(key) not in self.dataset.indexes:
+                    raise HTTPError(400, f"cannot filter rows by {key}; expected one of "
+                                         f"{', '.join(k for k, v in DIMENSIONS.items() if v in self.dataset.indexes)}")
+                filters[DIMENSIONS[key]] = values
+        positions = self.dataset.positions(filters)
+        rows = self.dataset.df.take(positions[:limit])
+        return ('{"version": %d, "total": %d, "rows": %s}'
+                % (self.version, len(positions), rows.to_json(orient='records'))).encode()
+
+    def chart(self, name, params):
+        if name not in self.jobs:
+            raise HTTPError(404, f'unknown chart {name}')
+        fmt = params.get('format', ['png'])[0]
+        if fmt not in CONTENT_TYPES:
+            raise HTTPError(400, f"format must be one of {', '.join(CONTENT_TYPES)}")
+        try:
+            dpi = int(params.get('dpi', ['100'])[0])
+        except ValueError:
+            raise HTTPError(400, 'dpi must be an integer')
+        return self.jobs[name], fmt, dpi
+
+    async def dispatch(self, method, target):
+        loop = asyncio.get_running_loop()
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip('/') or '/'
+        params = parse_qs(url.query)
+
+        if path == '/reload':
+            if method != 'POST':
+                raise HTTPError(405, 'use POST to reload')
+            await loop.run_in_executor(self.query_pool, self.load)
+            # Results are only touched on the loop thread
+            self.results.clear()
+            return 'application/json', json.dumps({'version': self.version}).encode()
+        if method != 'GET':
+            raise HTTPError(405, f'{method} is not supported')
+
+        if path == '/health':
+            return 'application/json', json.dumps({'status': 'ok', 'version': self.version}).encode()
+        if path == '/dimensions':
+            return 'application/json', json.dumps(sorted(DIMENSIONS)).encode()
+        if path == '/metrics':
+            return 'application/json', json.dumps(sorted(METRICS)).encode()
+        if path == '/charts':
+            return 'application/json', json.dumps(sorted(self.jobs)).encode()
+
+        if path == '/query':
+            key = ('query', self.version, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+            body = self.results.get(key)
+            if body is None:
+                body = await loop.run_in_executor(self.query_pool, self.query, params)
+                self.results.put(key, body)
+            return 'application/json', body
+
+        if path == '/rows':
+            return 'application/json', await loop.run_in_executor(self.query_pool, self.matching_rows, params)
+
+        if path.startswith('/chart/'):
+            job, fmt, dpi = self.chart(path[len('/chart/'):], params)
+            key = ('chart', chart_fingerprint(job, fmt, dpi))
+            body = self.results.get(key)
+            if body is None:
+                body = await loop.run_in_executor(self.render_pool, render_bytes, job, fmt, dpi)
+                self.results.put(key, body)
+            return CONTENT_TYPES[fmt], body
+
+        raise HTTPError(404, f'no route for {path}')
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1: one request per connection, request bodies ignored
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            if len(request_line) != 3:
+                raise HTTPError(400, 'malformed request line')
+            status = 200
+            content_type, body = await self.dispatch(request_line[0], request_line[1])
+        except HTTPError as error:
+            status, content_type = error.status, 'application/json'
+            body = json.dumps({'error': str(error)}).encode()
+        except Exception as error:  # keep serving after unexpected failures
+            status, content_type = 500, 'application/json'
+            body = json.dumps({'error': f'{type(error).__name__}: {error}'}).encode()
+        writer.write((f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                      f'Content-Type: {content_type}\r\n'
+                      f'Content-Length: {len(body)}\r\n'
+                      'Connection: close\r\n\r\n').encode() + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving {service.store or service.data_file} on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve campaign metric queries and charts over HTTP.')
+    parser.add_argument('data_file', nargs='?', default=DATA_FILE, help='campaign export CSV')
+    parser.add_argument('--store', default=None, help='serve the aggregate store built by store.py instead')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='query threads and render processes')
+    parser.add_argument('--chunk-size', type=int, default=None, help='stream the CSV in chunks of this many rows')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', help='ignore the parquet cache')
+    parser.add_argument('--backend', default=BACKEND, choices=available_backends(),
+                        help='engine that aggregates the data (duckdb and polars, when installed, run out of core)')
+    parser.add_argument('--rows', action='store_true',
+                        help='also keep the cleaned rows in memory, indexed by dimension, and serve /rows')
+    parser.add_argument('--cache-size', type=int, default=256, help='query results and charts kept in memory')
+    args = parser.parse_args(argv)
+    if args.rows and args.store:
+        parser.error('--rows needs the CSV; the aggregate store keeps no rows')
+    if args.store and not AggregateStore(args.store).exists():
+        parser.error(f'{args.store} holds no aggregate store yet; build it with store.py')
+    if not args.store:
+        try:
+            check_backend(args.backend, args.use_cache)
+        except ValueError as error:
+            parser.error(str(error))
+
+    service = QueryService(args.data_file, store=args.store, chunksize=args.chunk_size, use_cache=args.use_cache,
+                           workers=args.workers, cache_size=args.cache_size, rows=args.rows,
+                           backend=args.backend)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import json
+import os
+import re
+
+# Directory layout shared by the persisted stores: files written once under
+# versioned names, and state.json naming the current ones. An update writes its
+# new files and then replaces state.json, so an interrupted update leaves the
+# previous state intact; files of earlier versions are removed afterwards.
+# A store only touches state.json and files matching its own name pattern, and
+# refuses a directory holding anything else
+
+STATE_FILE = 'state.json'
+
+
+class VersionedDirectory:
+
+    def __init__(self, path, version_file, empty_state, owner):
+        # `version_file` matches the names of the versioned files the store
+        # writes, `owner` names the store in error messages
+        self.path = path
+        self.version_file = re.compile(version_file)
+        self.empty_state = empty_state
+        self.owner = owner
+        self.state_file = os.path.join(path, STATE_FILE)
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self):
+        return os.path.exists(self.state_file)
+
+    def state(self):
+        if not self.exists():
+            return dict(self.empty_state)
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def foreign_files(self):
+        # Entries of the directory the store did not write
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path)
+                      if name not in (STATE_FILE, STATE_FILE + '.tmp') and not self.version_file.match(name))
+
+    def prepare(self):
+        # Create the directory, or check that it holds nothing but the store
+        foreign = self.foreign_files()
+        if foreign:
+            raise ValueError(f"{self.path} holds files the {self.owner} did not write ({', '.join(foreign[:5])}); "
+                             "give the store a directory of its own")
+        os.makedirs(self.path, exist_ok=True)
+
+    def commit(self, state, referenced):
+        # Make `state` current, then remove the versioned files it no longer references
+        with open(self.state_file + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(self.state_file + '.tmp', self.state_file)
+        for entry in os.scandir(self.path):
+            if self.version_file.match(entry.name) and entry.name not in referenced and entry.is_file():
+                os.remove(entry.path)
@@ -0,0 +1,141 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean
+from cube import CUBE_COLUMNS, build_cube, merge_cubes
+from ingest import DATE_COLUMN, RAW_COLUMNS
+from storage import VersionedDirectory
+
+# A persisted aggregate store: the cube of every row ingested so far plus the
+# keys of those rows. Daily delta exports are deduplicated against the keys and
+# folded into the cube, so a refresh costs time proportional to the delta.
+# Derived metrics (CTR, CPC, CPM, clicks per ₹1000) are never stored; they are
+# recomputed from the summed measures whenever the cube is rolled up
+
+STORE_DIR = '.store'
+
+# Rows are identified by all of the columns the analysis reads, plus the
+# reporting date when the export has one, unless told otherwise
+DEFAULT_KEY_COLUMNS = RAW_COLUMNS
+
+# Merge the key segments into one once there are this many
+MAX_KEY_SEGMENTS = 32
+
+
+def row_keys(raw, key_columns):
+    # 64-bit hash per row of the key columns, read as strings so the key does not
+    # depend on how a particular file or chunk happened to be typed
+    return pd.util.hash_pandas_object(raw[key_columns], index=False).to_numpy()
+
+
+class AggregateStore:
+    # Layout: state.json names the current cube file and key segments, written
+    # as a VersionedDirectory
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.directory = VersionedDirectory(path, r'(cube-\d{6}\.pkl|keys-\d{6}\.npy)$',
+                                            {'version': 0, 'rows': 0, 'cube': None, 'segments': []},
+                                            'aggregate store')
+
+    def exists(self):
+        return self.directory.exists()
+
+    def state(self):
+        return self.directory.state()
+
+    def load_cube(self, state=None):
+        state = state or self.state()
+        return pd.read_pickle(self.directory.file(state['cube'])) if state['cube'] else None
+
+    def _seen(self, keys, segments):
+        # Which of `keys` are already stored. Segments are sorted and memory-mapped,
+        # so each lookup only touches O(len(keys) * log(segment size)) of the file
+        seen = np.zeros(len(keys), dtype=bool)
+        for segment_file in segments:
+            segment = np.load(self.directory.file(segment_file), mmap_mode='r')
+            if len(segment):
+                positions = np.searchsorted(segment, keys).clip(max=len(segment) - 1)
+                seen |= segment[positions] == keys
+        return seen
+
+    def append(self, path, key_columns=None, chunksize=500_000, date_column=DATE_COLUMN):
+        # Fold the rows of `path` that are not stored yet into the cube. Returns
+        # (rows added, duplicate rows skipped)
+        if key_columns is None:
+            # Without the date, identical rows reported on different days would count once
+            key_columns = DEFAULT_KEY_COLUMNS + [date_column] * (date_column in pd.read_csv(path, nrows=0).columns)
+        key_columns = list(key_columns)
+        self.directory.prepare()
+        state = self.state()
+        cube = self.load_cube(state)
+
+        new_keys = []
+        added = skipped = 0
+        reader = pd.read_csv(path, usecols=sorted(set(RAW_COLUMNS) | set(key_columns)), dtype=str,
+                             chunksize=chunksize)
+        for raw in reader:
+            keys = row_keys(raw, key_columns)
+            fresh = ~self._seen(keys, state['segments'])
+            # Duplicates inside the delta itself, within and across its chunks
+            fresh &= ~pd.Series(keys).duplicated().to_numpy()
+            if new_keys:
+                fresh &= ~np.isin(keys, np.concatenate(new_keys))
+            skipped += int((~fresh).sum())
+            if not fresh.any():
+                continue
+
+            chunk = clean(raw.loc[fresh, RAW_COLUMNS].reset_index(drop=True))
+            partial = build_cube(chunk[CUBE_COLUMNS], row_offset=state['rows'] + added)
+            cube = partial if cube is None else merge_cubes([cube, partial])
+            new_keys.append(keys[fresh])
+            added += len(chunk)
+
+        if not added:
+            return 0, skipped
+
+        version = state['version'] + 1
+        keys = np.sort(np.concatenate(new_keys))
+        segments = state['segments']
+        if len(segments) >= MAX_KEY_SEGMENTS:
+            # Occasional compaction keeps the number of segments probed per lookup bounded
+            keys = np.sort(np.concatenate([keys] + [np.load(self.directory.file(f)) for f in segments]))
+            segments = []
+        new_state = {
+            'version': version,
+            'rows': state['rows'] + added,
+            'cube': f'cube-{version:06d}.pkl',
+            'segments': segments + [f'keys-{version:06d}.npy'],
+        }
+        np.save(self.directory.file(new_state['segments'][-1]), keys)
+        pd.to_pickle(cube, self.directory.file(new_state['cube']))
+        self.directory.commit(new_state, {new_state['cube'], *new_state['segments']})
+        return added, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Fold a campaign export (the full history or a daily delta) into the aggregate store.')
+    parser.add_argument('data_file', help='campaign export CSV')
+    parser.add_argument('--store', default=STORE_DIR, help='aggregate store directory')
+    parser.add_argument('--key', nargs='+', default=None,
+                        help='columns identifying a row (default: every column the analysis reads, '
+                             'and the reporting date when the export has it)')
+    parser.add_argument('--date-column', default=DATE_COLUMN,
+                        help='reporting-date column added to the default row key')
+    parser.add_argument('--chunk-size', type=int, default=500_000, help='rows read at a time')
+    args = parser.parse_args(argv)
+
+    store = AggregateStore(args.store)
+    try:
+        added, skipped = store.append(args.data_file, key_columns=args.key, chunksize=args.chunk_size,
+                                      date_column=args.date_column)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Added {added} rows to {args.store} ({skipped} already ingested), {store.state()['rows']} rows in total")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from backends import available_backends, load_cube
+from benchmark import generate
+from cache import cache_available
+from insights import build_tables
+from rollups import RollupCache
+
+pytestmark = pytest.mark.skipif(not cache_available(), reason='the out-of-core backends need pyarrow')
+
+ENGINES = ['duckdb', 'polars']
+
+
+@pytest.fixture
+def export(tmp_path):
+    path = tmp_path / 'export.csv'
+    generate(path, 20_000, campaigns=30, missing_campaign_ids=0.05)
+    return path
+
+
+def engine(name):
+    if name not in available_backends():
+        pytest.skip(f'{name} is not installed')
+    return name
+
+
+def assert_same_tables(left, right):
+    assert left.keys() == right.keys()
+    for name in left:
+        if isinstance(left[name], pd.Series):
+            pd.testing.assert_series_equal(left[name], right[name], obj=name)
+        else:
+            pd.testing.assert_frame_equal(left[name], right[name], obj=name)
+
+
+@pytest.mark.parametrize('backend', ENGINES)
+def test_cube_and_tables_match_pandas(export, backend):
+    expected = load_cube(export)
+    cube = load_cube(export, backend=engine(backend))
+    pd.testing.assert_frame_equal(cube, expected)
+    assert_same_tables(build_tables(cube, RollupCache()), build_tables(expected, RollupCache()))
+
+
+@pytest.mark.parametrize('backend', ENGINES)
+def test_column_subset_matches_pandas(export, backend):
+    columns = ['campaign ID', 'Age', 'Clicks', 'Amount Spent in INR', 'CPC_Clean']
+    pd.testing.assert_frame_equal(load_cube(export, backend=engine(backend), columns=columns),
+                                  load_cube(export, columns=columns))
+
+
+@pytest.mark.parametrize('backend', ENGINES)
+def test_sums_too_large_for_int32_match_pandas(export, backend):
+    frame = pd.read_csv(export)
+    frame['Reach'] = 2_000_000_000
+    frame.to_csv(export, index=False)
+    expected = load_cube(export)
+    assert expected['Reach'].dtype == 'int64'
+    pd.testing.assert_frame_equal(load_cube(export, backend=engine(backend)), expected)
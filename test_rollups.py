@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import rollups
+from cube import CUBE_DIMENSIONS, build_cube, rollup
+from rollups import RollupCache
+
+
+@pytest.fixture
+def cube():
+    # Small cleaned frame over every cube column, with missing campaign IDs
+    rng = np.random.default_rng(0)
+    n = 2000
+    ids = np.array([f'12020000000000{i}' for i in range(6)], dtype=object)[rng.integers(0, 6, n)]
+    ids[rng.random(n) < 0.1] = None
+    frame = pd.DataFrame({
+        'campaign ID': pd.Categorical(ids),
+        'Campaign Name': pd.Categorical(rng.choice(['A', 'B', 'C'], n)),
+        'Age': pd.Categorical(rng.choice(['13-17', '18-24', '25-34'], n)),
+        'Audience': pd.Categorical(rng.choice(['Students', 'Educators and Principals'], n)),
+        'Geography_Clean': pd.Categorical(rng.choice(['India', 'Nepal', 'Ghana'], n)),
+        'Reach': rng.integers(0, 1000, n).astype(np.int32),
+        'Impressions': rng.integers(0, 2000, n).astype(np.int32),
+        'Clicks': rng.integers(0, 50, n).astype(np.int32),
+        'Amount Spent in INR': rng.random(n) * 500,
+        'Click-Through Rate (CTR in %)': np.where(rng.random(n) < 0.05, np.nan, rng.random(n) * 5).astype(np.float32),
+        'CPC_Clean': np.where(rng.random(n) < 0.05, np.nan, rng.random(n) * 30),
+    })
+    return build_cube(frame)
+
+
+def direct(cube, dims, filters=None):
+    # The rollup computed straight from the cube cells matching the filters
+    mask = pd.Series(True, index=cube.index)
+    for column, values in (filters or {}).items():
+        mask &= cube[column].isin(values)
+    return rollup(cube[mask], dims)
+
+
+def test_rollup_matches_cube_rollup(cube):
+    cache = RollupCache()
+    pd.testing.assert_frame_equal(cache.rollup(cube, ['campaign ID', 'Age']), direct(cube, ['campaign ID', 'Age']))
+    assert cache.stats['computed'] == 1
+
+
+def test_memory_hit(cube):
+    cache = RollupCache()
+    first = cache.rollup(cube, 'Age')
+    second = cache.rollup(cube, 'Age')
+    pd.testing.assert_frame_equal(first, second)
+    assert cache.stats == {'memory': 1, 'disk': 0, 'derived': 0, 'computed': 1}
+
+
+def test_coarse_rollup_is_derived_from_finer_one(cube):
+    cache = RollupCache()
+    cache.rollup(cube, ['campaign ID', 'Age', 'Audience'])
+    for dims in [['campaign ID'], ['Age', 'Audience'], ['Audience']]:
+        pd.testing.assert_frame_equal(cache.rollup(cube, dims), direct(cube, dims))
+    assert cache.stats['computed'] == 1
+    assert cache.stats['derived'] == 3
+
+
+def test_derived_rollup_keeps_missing_keys_out(cube):
+    # Missing campaign IDs are kept in cached entries so coarser rollups count
+    # them, and dropped from what is returned
+    cache = RollupCache()
+    fine = cache.rollup(cube, ['campaign ID', 'Age'])
+    assert fine.index.get_level_values('campaign ID').notna().all()
+    pd.testing.assert_frame_equal(cache.rollup(cube, 'Age'), direct(cube, 'Age'))
+    assert cache.stats['derived'] == 1
+
+
+def test_filters_on_a_cached_dimension_are_derived(cube):
+    cache = RollupCache()
+    cache.rollup(cube, ['campaign ID', 'Age'])
+    campaign = cube['campaign ID'].dropna().iloc[0]
+    filters = {'campaign ID': [campaign]}
+    pd.testing.assert_frame_equal(cache.rollup(cube, 'Age', filters=filters), direct(cube, 'Age', filters))
+    assert cache.stats['derived'] == 1
+
+
+def test_filtered_entry_serves_narrower_filters_only(cube):
+    cache = RollupCache()
+    ages = {'Age': ['18-24', '25-34']}
+    cache.rollup(cube, ['Age', 'Audience'], filters=ages)
+    narrower = {'Age': ['18-24', '25-34'], 'Audience': ['Students']}
+    pd.testing.assert_frame_equal(cache.rollup(cube, 'Age', filters=narrower), direct(cube, 'Age', narrower))
+    assert cache.stats['derived'] == 1
+    # The unfiltered rollup cannot come from a filtered entry
+    pd.testing.assert_frame_equal(cache.rollup(cube, 'Age'), direct(cube, 'Age'))
+    assert cache.stats['computed'] == 2
+
+
+def test_filter_on_a_dimension_the_entry_lacks_is_computed(cube):
+    cache = RollupCache()
+    cache.rollup(cube, ['campaign ID', 'Age'])
+    filters = {'Geography_Clean': ['India']}
+    pd.testing.assert_frame_equal(cache.rollup(cube, 'Age', filters=filters), direct(cube, 'Age', filters))
+    assert cache.stats['derived'] == 0
+    assert cache.stats['computed'] == 2
+
+
+def test_changed_data_is_not_served_from_cache(cube):
+    cache = RollupCache()
+    cache.rollup(cube, ['campaign ID', 'Age'])
+    changed = cube.assign(Clicks=cube['Clicks'] + 1)
+    pd.testing.assert_frame_equal(cache.rollup(changed, 'Age'), direct(changed, 'Age'))
+    assert cache.stats['derived'] == 0
+
+
+def test_disk_tier_is_shared_between_caches(cube, tmp_path):
+    RollupCache(path=tmp_path).rollup(cube, ['campaign ID', 'Age'])
+    cache = RollupCache(path=tmp_path)
+    pd.testing.assert_frame_equal(cache.rollup(cube, ['campaign ID', 'Age']), direct(cube, ['campaign ID', 'Age']))
+    assert cache.stats['disk'] == 1
+    assert cache.stats['computed'] == 0
+
+
+def test_disk_tier_is_not_shared_across_rollup_versions(cube, tmp_path, monkeypatch):
+    RollupCache(path=tmp_path).rollup(cube, 'Age')
+    monkeypatch.setattr(rollups, 'ROLLUP_VERSION', rollups.ROLLUP_VERSION + 1)
+    cache = RollupCache(path=tmp_path)
+    cache.rollup(cube, 'Age')
+    assert cache.stats['disk'] == 0
+    assert cache.stats['computed'] == 1
+
+
+def test_first_values(cube):
+    cache = RollupCache()
+    expected = cube.sort_values('first_row').groupby('campaign ID', observed=True)[CUBE_DIMENSIONS[1:2]].first()
+    pd.testing.assert_frame_equal(cache.first_values(cube, 'campaign ID', CUBE_DIMENSIONS[1:2]), expected)
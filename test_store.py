@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from benchmark import generate
+from ingest import DATE_COLUMN, load_cube
+from store import AggregateStore
+
+
+@pytest.fixture
+def export(tmp_path):
+    # Ten days of rows in date order, every row distinct
+    path = tmp_path / 'generated.csv'
+    generate(path, 5000, campaigns=12, days=10)
+    frame = pd.read_csv(path, dtype=str).sort_values(DATE_COLUMN, kind='stable').reset_index(drop=True)
+    assert not frame.duplicated().any()
+    return frame
+
+
+def write(frame, path):
+    frame.to_csv(path, index=False)
+    return path
+
+
+def test_overlapping_delta_is_folded_once(export, tmp_path):
+    history = export[export[DATE_COLUMN] < '2024-01-08']
+    # The delta repeats two days of the history and one of its own rows
+    delta = export[export[DATE_COLUMN] >= '2024-01-06']
+    delta = pd.concat([delta, delta.iloc[[0]]])
+    store = AggregateStore(tmp_path / 'store')
+    assert store.append(write(history, tmp_path / 'history.csv')) == (len(history), 0)
+    new = len(export) - len(history)
+    added, skipped = store.append(write(delta, tmp_path / 'delta.csv'), chunksize=500)
+    assert (added, skipped) == (new, len(delta) - new)
+    expected = load_cube(write(export, tmp_path / 'full.csv'), use_cache=False)
+    pd.testing.assert_frame_equal(store.load_cube(), expected)
+
+    # Appending the delta again adds nothing
+    assert store.append(tmp_path / 'delta.csv') == (0, len(delta))
+    pd.testing.assert_frame_equal(store.load_cube(), expected)
+    assert store.state()['rows'] == len(export)
+
+
+def test_same_row_on_another_day_is_kept(export, tmp_path):
+    day = export[export[DATE_COLUMN] == '2024-01-01']
+    store = AggregateStore(tmp_path / 'store')
+    store.append(write(day, tmp_path / 'day1.csv'))
+    assert store.append(write(day.assign(**{DATE_COLUMN: '2024-01-02'}), tmp_path / 'day2.csv')) == (len(day), 0)
+    # Without the date in the key the copy is a duplicate
+    store = AggregateStore(tmp_path / 'nodate')
+    key = [column for column in day.columns if column != DATE_COLUMN]
+    store.append(tmp_path / 'day1.csv', key_columns=key)
+    assert store.append(tmp_path / 'day2.csv', key_columns=key) == (0, len(day))
+
+
+def test_store_refuses_a_directory_it_did_not_create(export, tmp_path):
+    path = write(export.head(10), tmp_path / 'export.csv')
+    with pytest.raises(ValueError, match='export.csv'):
+        AggregateStore(tmp_path).append(path)
+    assert path.exists()
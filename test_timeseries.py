@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import generate
+from timeseries import BLOCK_DAYS, SERIES_DIMENSIONS, SERIES_MEASURES, DailySeries, TimeSeriesStore, read_cells
+
+
+@pytest.fixture
+def cells():
+    # Daily totals for 40 days of six series, with days and series missing here and there
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2024-01-01', periods=40)
+    frame = pd.DataFrame([(date, f'1202000000000{c}', audience) for date in dates for c in range(3)
+                          for audience in ['Students', 'Educators and Principals']],
+                         columns=['date'] + SERIES_DIMENSIONS)
+    frame = frame[rng.random(len(frame)) < 0.8].reset_index(drop=True)
+    for measure in SERIES_MEASURES:
+        frame[measure] = rng.integers(1, 1000, len(frame)).astype(np.float64)
+    return frame
+
+
+def reference(cells, window):
+    # Trailing window sums per series by pandas rolling over calendar days
+    dates = pd.date_range(cells['date'].min(), cells['date'].max())
+    frames = []
+    for key, group in cells.groupby(SERIES_DIMENSIONS):
+        sums = group.set_index('date')[SERIES_MEASURES].reindex(dates, fill_value=0).rolling(window, min_periods=1).sum()
+        frames.append(sums.assign(**dict(zip(SERIES_DIMENSIONS, key))).rename_axis('date').reset_index())
+    frame = pd.concat(frames, ignore_index=True)
+    frame = frame[frame[SERIES_MEASURES].any(axis=1)]
+    return frame.set_index(['date'] + SERIES_DIMENSIONS).sort_index()
+
+
+def windowed(series, window):
+    frame = series.rolling([window])
+    frame = frame.rename(columns={measure + f'_{window}d': measure for measure in SERIES_MEASURES})
+    return frame.set_index(['date'] + SERIES_DIMENSIONS)[SERIES_MEASURES].sort_index()
+
+
+def assert_same_series(left, right):
+    for window in (1, 7, 28):
+        pd.testing.assert_frame_equal(windowed(left, window), windowed(right, window))
+
+
+def folded(*parts, replace_days=False):
+    series = DailySeries()
+    for part in parts:
+        series.update(part.reset_index(drop=True), replace_days)
+    return series
+
+
+@pytest.mark.parametrize('window', [7, 28])
+def test_rolling_matches_pandas(cells, window):
+    # The series keeps its keys as objects, pandas may infer a string dtype for them
+    pd.testing.assert_frame_equal(windowed(folded(cells), window), reference(cells, window), check_dtype=False,
+                                  check_index_type=False)
+
+
+def test_ratios_come_from_window_sums(cells):
+    frame = folded(cells).rolling([7])
+    np.testing.assert_allclose(frame['CTR_7d'], frame['Clicks_7d'] / frame['Impressions_7d'] * 100)
+    np.testing.assert_allclose(frame['CPC_7d'], frame['Amount Spent in INR_7d'] / frame['Clicks_7d'])
+    np.testing.assert_allclose(frame['CPM_7d'], frame['Amount Spent in INR_7d'] / frame['Impressions_7d'] * 1000)
+
+
+def test_day_by_day_matches_one_fold(cells):
+    assert_same_series(folded(*[day for _, day in cells.groupby('date')]), folded(cells))
+
+
+def test_partial_day_is_replaced(cells):
+    last = cells['date'] == cells['date'].max()
+    history, today = cells[~last], cells[last]
+    partial = today.iloc[:len(today) // 2].assign(Clicks=1.0)
+    assert_same_series(folded(history, partial, today), folded(cells))
+    # Folding the same day again changes nothing
+    assert_same_series(folded(history, today, today), folded(cells))
+
+
+def test_restated_earlier_day_is_replaced(cells):
+    day = cells['date'] == pd.Timestamp('2024-01-10')
+    wrong = cells[day].assign(Impressions=0.0)
+    series = folded(cells, wrong)
+    assert not series.totals().query("date == '2024-01-10'")['Impressions'].any()
+    series.update(cells[day].reset_index(drop=True))
+    assert_same_series(series, folded(cells))
+
+
+def test_export_of_some_series_keeps_the_others(cells):
+    # A late-rows or per-campaign export only replaces the series it has
+    day = cells['date'] == pd.Timestamp('2024-01-10')
+    students = cells['Audience'] == 'Students'
+    restated = cells[day & students].assign(Clicks=1.0)
+    series = folded(cells, restated)
+    assert_same_series(series, folded(pd.concat([cells[~(day & students)], restated])))
+
+
+def test_replace_days_drops_series_it_no_longer_has(cells):
+    day = cells['date'] == pd.Timestamp('2024-01-10')
+    restated = cells[day & (cells['Audience'] == 'Students')]
+    series = folded(cells, restated, replace_days=True)
+    assert_same_series(series, folded(cells[~day | (cells['Audience'] == 'Students')]))
+
+
+def test_gap_after_stored_history(cells):
+    early = cells['date'] < pd.Timestamp('2024-01-10')
+    late = cells['date'] >= pd.Timestamp('2024-01-20')
+    series = folded(cells[early], cells[late])
+    assert series.days == 40
+    assert_same_series(series, folded(cells[early | late]))
+    pd.testing.assert_frame_equal(windowed(series, 28), reference(cells[early | late], 28), check_dtype=False,
+                                  check_index_type=False)
+
+
+def test_backfill_before_first_date(cells):
+    late = cells['date'] >= pd.Timestamp('2024-01-20')
+    series = folded(cells[late], cells[~late])
+    assert series.start == cells['date'].min()
+    assert_same_series(series, folded(cells))
+
+
+def test_series_appearing_later(cells):
+    new = cells['campaign ID'] == '12020000000002'
+    late = cells['date'] >= pd.Timestamp('2024-01-15')
+    series = folded(cells[~new], cells[late])
+    # The new series only has the days it was folded in with
+    expected = pd.concat([cells[~new], cells[late & new]])
+    assert_same_series(series, folded(expected))
+    assert len(series.keys) == 6
+
+
+def test_latest_days_match_full_history(cells):
+    series = folded(cells)
+    full = series.rolling()
+    latest = series.rolling(days=3)
+    pd.testing.assert_frame_equal(latest, full[full['date'] >= full['date'].max() - pd.Timedelta(days=2)]
+                                  .reset_index(drop=True))
+
+
+def test_weekly_totals(cells):
+    weekly = folded(cells).totals('W')
+    assert (weekly['date'].dt.dayofweek == 0).all()
+    expected = cells.groupby([pd.Grouper(key='date', freq='W-MON', label='left', closed='left')] + SERIES_DIMENSIONS)[
+        SERIES_MEASURES].sum()
+    pd.testing.assert_frame_equal(weekly.set_index(['date'] + SERIES_DIMENSIONS)[SERIES_MEASURES].sort_index(),
+                                  expected[expected.any(axis=1)].sort_index(), check_names=False, check_index_type=False)
+
+
+def test_store_round_trip(tmp_path):
+    export = tmp_path / 'export.csv'
+    generate(export, 5000, campaigns=4, days=20)
+    store = TimeSeriesStore(tmp_path / 'series')
+    rows, skipped, dates, _ = store.append(export)
+    assert (rows, skipped, len(dates)) == (5000, 0, 20)
+    # The store holds plain files, so a fresh store object (or process) reads it back
+    loaded = TimeSeriesStore(tmp_path / 'series').load()
+    cells, _, _ = read_cells(export)
+    assert_same_series(loaded, folded(cells))
+    # Folding the export again replaces its days with the same totals
+    store.append(export)
+    assert_same_series(store.load(), loaded)
+    assert sorted(p.name for p in (tmp_path / 'series').iterdir()) == [
+        'days-00000-000002.npy', 'days-00001-000002.npy', 'days-00002-000002.npy', 'keys-000001.csv', 'state.json']
+
+
+def store_cells(store, tmp_path, *parts, **append):
+    # Fold each part into the store as an export of its own; returns the last result
+    for i, part in enumerate(parts):
+        path = tmp_path / f'part{i}.csv'
+        part.rename(columns={'date': 'Reporting starts'}).to_csv(path, index=False)
+        result = store.append(path, **append)
+    return result
+
+
+@pytest.fixture
+def exports(cells):
+    # The cells as export rows, every other cleaned column of the export filled in
+    return cells.assign(**{'Campaign Name': 'A', 'Age': '18-24', 'Geography': 'India', 'Reach': 1,
+                           'Cost Per Click (CPC)': '1', 'Click-Through Rate (CTR in %)': '1'})
+
+
+def test_store_folds_match_in_memory_folds(exports, tmp_path):
+    early = exports['date'] < pd.Timestamp('2024-01-12')
+    middle = (exports['date'] >= pd.Timestamp('2024-01-20')) & (exports['date'] < pd.Timestamp('2024-01-30'))
+    late = exports['date'] >= pd.Timestamp('2024-01-30')
+    # Later days, more after a gap, a backfill, the days in between and a restatement
+    parts = [exports[middle], exports[late & (exports['date'] >= pd.Timestamp('2024-02-05'))], exports[early],
+             exports[late], exports[~early & ~middle & ~late],
+             exports[exports['Audience'] == 'Students'].assign(Clicks=2)]
+    store = TimeSeriesStore(tmp_path / 'series')
+    store_cells(store, tmp_path, *parts)
+    expected = folded(*[read_cells(tmp_path / f'part{i}.csv')[0] for i in range(len(parts))])
+    assert_same_series(store.load(), expected)
+
+
+def test_fold_rewrites_only_the_blocks_it_changes(exports, tmp_path):
+    last = exports['date'] == exports['date'].max()
+    store = TimeSeriesStore(tmp_path / 'series')
+    store_cells(store, tmp_path, exports)
+    before = store.state()
+    _, _, dates, series = store_cells(store, tmp_path, exports[last].assign(Clicks=1))
+    after = store.state()
+    assert after['blocks'][:-1] == before['blocks'][:-1]
+    assert after['blocks'][-1] != before['blocks'][-1]
+    # Only the changed blocks were read, and the full history gives the same series
+    assert series.start == dates[0] - pd.Timedelta(days=(dates[0] - series.origin).days % BLOCK_DAYS)
+    pd.testing.assert_frame_equal(series.totals(), store.load().totals().query('date >= @series.start')
+                                  .reset_index(drop=True))
+    # Restating an early day rewrites its block alone
+    store_cells(store, tmp_path, exports[exports['date'] == pd.Timestamp('2024-01-03')].assign(Clicks=1))
+    assert [a == b for a, b in zip(store.state()['blocks'], after['blocks'])] == [False] + [True] * 5
+
+
+def test_latest_windows_from_the_last_blocks(exports, tmp_path):
+    store = TimeSeriesStore(tmp_path / 'series')
+    last = exports['date'] == exports['date'].max()
+    _, _, _, series = store_cells(store, tmp_path, exports, exports[last], days=3 + 28 - 1)
+    full = store.load()
+    assert series.start > full.start
+    pd.testing.assert_frame_equal(series.rolling(days=3), full.rolling(days=3))
+    pd.testing.assert_frame_equal(store.load(3 + 28 - 1).rolling(days=3), full.rolling(days=3))
+    with pytest.raises(ValueError, match='too few'):
+        store.load(3).rolling(days=3)
+
+
+def test_store_refuses_a_directory_it_did_not_create(tmp_path):
+    export = tmp_path / 'export.csv'
+    generate(export, 100, days=2)
+    with pytest.raises(ValueError, match='export.csv'):
+        TimeSeriesStore(tmp_path).append(export)
+    assert export.exists()
@@ -0,0 +1,334 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean
+from ingest import DATE_COLUMN, RAW_COLUMNS
+from profiling import profiler
+from storage import VersionedDirectory
+
+# Daily time series per campaign ID and audience, keyed on the reporting date
+# of each row. Daily totals are kept as a dense (day x series x measure) array
+# alongside its running sum over the days, so the total over any window of days
+# is the difference of two running sums. A refresh replaces only the (date,
+# series) cells the new export has and recomputes the running sums from the
+# first of those days on. The store keeps the days in blocks and a refresh
+# reads the blocks from its first day on (or those the reported windows reach)
+# and rewrites only the ones it changes, so an hourly run costs time
+# proportional to the export and the days it touches, not to the history. Ratios (CTR, CPC, CPM) are recomputed from
+# the summed measures, never stored
+
+TIMESERIES_DIR = '.timeseries'
+
+SERIES_DIMENSIONS = ['campaign ID', 'Audience']
+SERIES_MEASURES = ['Impressions', 'Clicks', 'Amount Spent in INR']
+
+# Rolling windows in days
+WINDOWS = [7, 28]
+
+# Days per stored block
+BLOCK_DAYS = 7
+
+
+def ratios(frame, suffix=''):
+    # CTR, CPC and CPM from the summed measures, the same way the report derives them
+    impressions, clicks, spend = (frame[measure + suffix] for measure in SERIES_MEASURES)
+    frame['CTR' + suffix] = clicks / impressions * 100
+    frame['CPC' + suffix] = spend / clicks
+    frame['CPM' + suffix] = spend / impressions * 1000
+    return frame
+
+
+class DailySeries:
+    # daily[d, s] holds the measures of series s (a row of `keys`) on day
+    # start + d; running[d] is the sum of daily[:d], so running[0] is all
+    # zeros. The series may hold only the days from `start` on of a history
+    # beginning at `origin`; it then cannot take or report on earlier days
+
+    def __init__(self, keys=None, start=None, daily=None, origin=None):
+        if keys is None:
+            keys = pd.DataFrame({dim: pd.Series(dtype=object) for dim in SERIES_DIMENSIONS})
+        self.keys = keys
+        self.start = start
+        self.origin = start if origin is None else origin
+        self.daily = np.zeros((0, len(keys), len(SERIES_MEASURES))) if daily is None else daily
+        self.running = np.zeros((self.days + 1,) + self.daily.shape[1:])
+        np.cumsum(self.daily, axis=0, out=self.running[1:])
+
+    @property
+    def days(self):
+        return len(self.daily)
+
+    @property
+    def dates(self):
+        return pd.date_range(self.start, periods=self.days, freq='D') if self.days else pd.DatetimeIndex([])
+
+    def update(self, cells, replace_days=False):
+        # Replace the (date, series) cells in `cells` (one row per date and
+        # series, with a normalized 'date' column) with its totals; series it
+        # lacks keep theirs. With `replace_days`, every series on the dates it
+        # covers is replaced, dropping those it lacks. Returns the dates changed
+        with profiler.stage('timeseries.update', rows=len(cells)):
+            keys = pd.MultiIndex.from_frame(cells[SERIES_DIMENSIONS].astype(object))
+            ids = pd.MultiIndex.from_frame(self.keys).get_indexer(keys)
+            if (ids < 0).any():
+                new = keys[ids < 0].unique().to_frame(index=False)
+                self.keys = pd.concat([self.keys, new], ignore_index=True)
+                ids = pd.MultiIndex.from_frame(self.keys).get_indexer(keys)
+                self.daily = self._pad(self.daily, 1, len(self.keys) - self.daily.shape[1])
+                self.running = self._pad(self.running, 1, len(self.keys) - self.running.shape[1])
+
+            first, last = cells['date'].min(), cells['date'].max()
+            # Running sums are valid up to the first day that changes
+            valid = self.days
+            if self.start is None:
+                self.start = self.origin = first
+            elif first < self.start:
+                if self.start > self.origin:
+                    raise ValueError(f'the series holds the days from {self.start.date()} on, '
+                                     f'not {first.date()}')
+                # Backfill before the stored history shifts every day
+                shift = (self.start - first).days
+                self.daily = self._pad(self.daily, 0, shift, before=True)
+                self.running = self._pad(self.running, 0, shift, before=True)
+                self.start = self.origin = first
+                valid = 0
+            end = (last - self.start).days + 1
+            if end > self.days:
+                self.daily = self._pad(self.daily, 0, end - self.days)
+
+            days = (cells['date'] - self.start).dt.days.to_numpy()
+            touched = np.unique(days)
+            if replace_days:
+                self.daily[touched] = 0
+            self.daily[days, ids] = cells[SERIES_MEASURES].to_numpy(dtype=np.float64)
+
+            first_changed = min(valid, touched[0])
+            running = np.empty((self.days + 1,) + self.daily.shape[1:])
+            running[:first_changed + 1] = self.running[:first_changed + 1]
+            np.cumsum(self.daily[first_changed:], axis=0, out=running[first_changed + 1:])
+            running[first_changed + 1:] += running[first_changed]
+            self.running = running
+        return self.dates[touched]
+
+    @staticmethod
+    def _pad(array, axis, count, before=False):
+        if count <= 0:
+            return array
+        shape = list(array.shape)
+        shape[axis] = count
+        parts = [np.zeros(shape), array] if before else [array, np.zeros(shape)]
+        return np.concatenate(parts, axis=axis)
+
+    def _long(self, dates, arrays):
+        # Long frame of (date x series x measure) arrays, one set of measure
+        # columns per {suffix: array}, leaving out series with nothing on a date
+        keys = self.keys.iloc[np.tile(np.arange(len(self.keys)), len(dates))].reset_index(drop=True)
+        keys.insert(0, 'date', np.repeat(dates, len(self.keys)))
+        columns = {}
+        active = np.zeros(len(dates) * len(self.keys), dtype=bool)
+        for suffix, values in arrays.items():
+            values = values.reshape(-1, len(SERIES_MEASURES))
+            active |= values.any(axis=1)
+            columns.update({measure + suffix: values[:, i] for i, measure in enumerate(SERIES_MEASURES)})
+        frame = pd.concat([keys, pd.DataFrame(columns)], axis=1)
+        frame = frame[active].reset_index(drop=True)
+        for suffix in arrays:
+            ratios(frame, suffix)
+        return frame[['date'] + SERIES_DIMENSIONS + [column + suffix for suffix in arrays
+                                                      for column in SERIES_MEASURES + ['CTR', 'CPC', 'CPM']]]
+
+    def totals(self, freq='D'):
+        # Daily ('D') or weekly ('W', weeks starting on Monday) totals and ratios per series
+        if freq not in ('D', 'W'):
+            raise ValueError(f"unknown frequency {freq}; expected 'D' or 'W'")
+        if freq == 'D' or not self.days:
+            return self._long(self.dates, {'': self.daily})
+        week = (self.start.dayofweek + np.arange(self.days)) // 7
+        starts = np.flatnonzero(np.diff(week, prepend=-1))
+        weeks = self.start - pd.Timedelta(days=self.start.dayofweek) + pd.to_timedelta(week[starts] * 7, unit='D')
+        return self._long(weeks, {'': np.add.reduceat(self.daily, starts, axis=0)})
+
+    def rolling(self, windows=WINDOWS, days=None):
+        # Totals and ratios over the trailing windows (in days, each ending on and
+        # including the date) for the last `days` dates, every date held by
+        # default. Windows reaching back before the first date cover the
+        # history there is
+        with profiler.stage('timeseries.rolling') as span:
+            end = np.arange(self.days - min(days or self.days, self.days), self.days) + 1
+            if self.days and self.start > self.origin and (end - max(windows)).min() < 0:
+                raise ValueError(f'the series holds the days from {self.start.date()} on, '
+                                 'too few for these windows')
+            frame = self._long(self.dates[end - 1], {
+                f'_{window}d': self.running[end] - self.running[np.maximum(end - window, 0)] for window in windows})
+            span['rows'] = len(frame)
+        return frame
+
+
+def read_cells(path, date_column=DATE_COLUMN, chunksize=500_000):
+    # Daily totals per series in an export, one row per date and series; rows
+    # without a campaign ID or audience belong to no series. Returns (cells,
+    # rows read, rows skipped for lacking a reporting date)
+    header = pd.read_csv(path, nrows=0).columns
+    if date_column not in header:
+        raise ValueError(f"{path} has no {date_column!r} column; name the reporting-date column with --date-column")
+    parts, rows, skipped = [], 0, 0
+    reader = pd.read_csv(path, usecols=RAW_COLUMNS + [date_column], dtype=str, chunksize=chunksize)
+    with profiler.stage('timeseries.read') as span:
+        for raw in reader:
+            dates = pd.to_datetime(raw[date_column], errors='coerce').dt.normalize()
+            chunk = clean(raw[RAW_COLUMNS].reset_index(drop=True)).assign(date=dates.to_numpy())
+            # Measures may be float32; accumulate them in float64 as the cube does
+            chunk[SERIES_MEASURES] = chunk[SERIES_MEASURES].astype(np.float64)
+            rows += len(chunk)
+            skipped += int(dates.isna().sum())
+            parts.append(chunk.groupby(['date'] + SERIES_DIMENSIONS, observed=True)[SERIES_MEASURES].sum())
+        span['rows'] = rows
+    if not parts:
+        return pd.DataFrame(columns=['date'] + SERIES_DIMENSIONS + SERIES_MEASURES), rows, skipped
+    # A date may be split across chunks
+    cells = pd.concat(parts).groupby(level=[0, 1, 2], observed=True).sum().reset_index()
+    return cells, rows, skipped
+
+
+class TimeSeriesStore:
+    # Layout: state.json holds the first date and the number of days and names
+    # the current series keys (CSV) and day blocks, written as a
+    # VersionedDirectory. Block b (a .npy file) holds the daily totals of the
+    # BLOCK_DAYS days from day b * BLOCK_DAYS, for the series there were when
+    # it was written; later series have nothing on its days. An update writes
+    # new files only for the blocks it changes
+
+    def __init__(self, path=TIMESERIES_DIR):
+        self.path = path
+        self.directory = VersionedDirectory(path, r'(keys-\d{6}\.csv|days-\d{5}-\d{6}\.npy)$',
+                                            {'version': 0, 'keys': None, 'series': 0, 'blocks': [], 'start': None, 'days': 0},
+                                            'time series store')
+
+    def exists(self):
+        return self.directory.exists()
+
+    def state(self):
+        return self.directory.state()
+
+    def _load(self, state, since=None):
+        # The stored series from the block holding `since` on, all of it by default
+        if not state['blocks']:
+            return DailySeries()
+        keys = pd.read_csv(self.directory.file(state['keys']), dtype=str, keep_default_na=False).astype(object)
+        origin = pd.Timestamp(state['start'])
+        first = 0 if since is None else min(max((since - origin).days // BLOCK_DAYS, 0), len(state['blocks']) - 1)
+        blocks = []
+        for name in state['blocks'][first:]:
+            block = np.load(self.directory.file(name))
+            blocks.append(DailySeries._pad(block, 1, len(keys) - block.shape[1]))
+        return DailySeries(keys, origin + pd.Timedelta(days=first * BLOCK_DAYS), np.concatenate(blocks), origin)
+
+    def load(self, days=None):
+        # The stored series, or only the blocks holding its last `days` days
+        state = self.state()
+        if days is None or not state['blocks']:
+            return self._load(state)
+        return self._load(state, pd.Timestamp(state['start']) + pd.Timedelta(days=state['days'] - days))
+
+    def append(self, path, date_column=DATE_COLUMN, chunksize=500_000, replace_days=False, days=0):
+        # Fold an export into the series. The export's totals for each date and
+        # series it has replace the stored ones, so re-reading today's export
+        # every hour, a restated export of earlier days or one campaign's export
+        # is safe. `replace_days` also drops the series the export lacks on the
+        # dates it covers. Returns (rows read, rows skipped, replaced dates, the
+        # series from the first replaced date on, and at least its last `days`
+        # days; all of it if `days` is None)
+        self.directory.prepare()
+        cells, rows, skipped = read_cells(path, date_column, chunksize)
+        if cells.empty:
+            return rows, skipped, pd.DatetimeIndex([]), self.load(days)
+        state = self.state()
+        since = cells['date'].min()
+        if state['blocks'] and days is not None:
+            end = max(pd.Timestamp(state['start']) + pd.Timedelta(days=state['days']),
+                      cells['date'].max() + pd.Timedelta(days=1))
+            since = min(since, end - pd.Timedelta(days=days))
+        series = self._load(state, None if days is None else since)
+        dates = series.update(cells, replace_days)
+
+        # The blocks of the replaced days and, when the series grew, every block
+        # from the old last day on; a backfill shifts them all
+        origin = series.origin.date().isoformat()
+        offset = (series.start - series.origin).days
+        total = offset + series.days
+        blocks = state['blocks'] + [None] * (-(-total // BLOCK_DAYS) - len(state['blocks']))
+        if origin != state['start']:
+            changed = set(range(len(blocks)))
+        else:
+            changed = set((dates - series.origin).days // BLOCK_DAYS)
+            if total > state['days']:
+                changed |= set(range(state['days'] // BLOCK_DAYS, len(blocks)))
+        version = state['version'] + 1
+        for b in sorted(changed):
+            first = b * BLOCK_DAYS - offset
+            blocks[b] = f'days-{b:05d}-{version:06d}.npy'
+            np.save(self.directory.file(blocks[b]), series.daily[first:first + BLOCK_DAYS])
+        keys = state['keys']
+        if len(series.keys) > state['series']:
+            keys = f'keys-{version:06d}.csv'
+            series.keys.to_csv(self.directory.file(keys), index=False)
+        new_state = {'version': version, 'keys': keys, 'blocks': blocks, 'start': origin, 'days': total,
+                     'series': len(series.keys)}
+        self.directory.commit(new_state, {keys, *blocks})
+        return rows, skipped, dates, series
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Fold a dated campaign export into the daily time series and print rolling CTR, CPC and CPM '
+                    'per campaign ID and audience.')
+    parser.add_argument('data_file', nargs='?', default=None,
+                        help='campaign export CSV with a reporting-date column (omit to report on the stored series)')
+    parser.add_argument('--date-column', default=DATE_COLUMN, help='reporting-date column of the export')
+    parser.add_argument('--replace-days', action='store_true',
+                        help='replace every series on the dates the export covers, dropping those it lacks '
+                             '(default: replace only the series it has)')
+    parser.add_argument('--store', default=TIMESERIES_DIR, help='time series directory')
+    parser.add_argument('--series', default='rolling', choices=['rolling', 'daily', 'weekly'],
+                        help='rolling-window metrics, or daily or weekly totals')
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS, help='rolling windows in days')
+    parser.add_argument('--days', type=int, default=1,
+                        help='rolling metrics for the last this many dates (0 for every date)')
+    parser.add_argument('--output', default=None, help='write the series to this CSV instead of printing it')
+    parser.add_argument('--chunk-size', type=int, default=500_000, help='rows read at a time')
+    args = parser.parse_args(argv)
+
+    # Only the latest rolling windows need just the last days of the history
+    days = args.days + max(args.windows) - 1 if args.series == 'rolling' and args.days else None
+    store = TimeSeriesStore(args.store)
+    if args.data_file:
+        try:
+            rows, skipped, dates, series = store.append(args.data_file, date_column=args.date_column,
+                                                        chunksize=args.chunk_size, replace_days=args.replace_days,
+                                                        days=days)
+        except ValueError as error:
+            parser.error(str(error))
+        replaced = f"{dates.min().date()} to {dates.max().date()}" if len(dates) else 'no dates'
+        print(f"Folded {rows - skipped} rows into {args.store}, replacing {replaced}"
+              f" ({skipped} rows without a reporting date skipped)")
+    elif not store.exists():
+        parser.error(f'{args.store} holds no series yet; pass an export to fold in')
+    else:
+        series = store.load(days)
+
+    if args.series == 'rolling':
+        result = series.rolling(args.windows, days=args.days or None)
+    else:
+        result = series.totals('D' if args.series == 'daily' else 'W')
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"Wrote {len(result)} rows to {args.output}")
+    else:
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(result.to_string(index=False, float_format='{:.2f}'.format))
+
+
+if __name__ == '__main__':
+    main()